@@ -0,0 +1,353 @@
+"""Bulk import of legacy incident logs and streaming export of resolved alerts.
+
+Import reads CSV or JSONL (one alert per row/line) and inserts it with
+executemany, IMPORT_BATCH_ROWS rows per transaction. The alerts and history
+indexes are dropped for the duration and rebuilt once at the end; the insert
+trigger that feeds the live change feed is lifted per transaction and its
+effect applied with one set-based statement instead of once per row.
+Imported alerts keep their timestamps and status and queue no enrichment jobs,
+but are indexed for duplicate detection and counted as references to stored
+media like alerts created in the app.
+
+    python alert_transfer.py import legacy.csv
+    python alert_transfer.py import legacy.jsonl --created-by legacy-system
+
+Columns are those of an export (id and priority_rank are ignored), and a
+location may stand in for the title. Rows without a description or
+department are skipped and reported.
+
+Export streams resolved alerts in resolved_at order (created_at for rows
+without one) straight off the database cursor, EXPORT_FETCH_ROWS at a time, so memory use doesn't grow with the
+range. --since is inclusive, --until exclusive; both take ISO dates or times
+(UTC, like the stored timestamps). Parquet needs pyarrow.
+
+    python alert_transfer.py export resolved-2024.parquet --since 2024-01-01 --until 2025-01-01
+    python alert_transfer.py export fire.csv --department Fire
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from whisper_llama3 import (
+    ALERT_COLUMNS, add_media_refs, compute_minhash, defer_indexes, get_db_pool, incident_title,
+    index_alert_signature, init_db, priority_rank, restore_deferred_indexes, rule_based_priority,
+    touch_deferred_indexes, PRIORITY_RANKS, RESOLVED_ORDER
+)
+
+IMPORT_BATCH_ROWS = 50000
+IMPORT_MAX_ERRORS_REPORTED = 20
+# Tables whose secondary indexes are rebuilt after the load rather than maintained row by row
+IMPORT_DEFERRED_INDEX_TABLES = ['alerts', 'alert_history']
+EXPORT_FETCH_ROWS = 5000
+EXPORT_COLUMNS = tuple(column for column in ALERT_COLUMNS if column != 'priority_rank')
+TRANSFER_FORMATS = ('csv', 'jsonl', 'parquet')
+
+IMPORT_INSERT_SQL = '''
+    INSERT INTO alerts
+    (title, description, department, priority, priority_rank, alert_type, media_path,
+     created_by, created_at, status, resolved_at, resolved_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# Set-based stand-ins for what create_alert and the alert_events_created trigger
+# do per row. History only ever feeds the priority prompt, so every row goes in;
+# only alerts that are still active are news for the live feed.
+IMPORT_HISTORY_SQL = '''
+    INSERT INTO alert_history (alert_id, title, department, priority, created_at)
+    SELECT id, title, department, priority, replace(created_at, ' ', 'T')
+    FROM alerts WHERE id > ? ORDER BY id
+'''
+IMPORT_EVENTS_SQL = '''
+    INSERT INTO alert_events (alert_id, department, event, created_at)
+    SELECT id, department, 'created', (julianday('now') - 2440587.5) * 86400.0
+    FROM alerts WHERE id > ? AND status = 'active' ORDER BY id
+'''
+IMPORT_INDEXED_SQL = '''
+    SELECT id, title, description, status, media_path
+    FROM alerts WHERE id > ? AND (status = 'active' OR media_path IS NOT NULL) ORDER BY id
+'''
+DEFERRED_TRIGGER = 'alert_events_created'
+
+
+def transfer_format(path: str, fmt: Optional[str] = None) -> str:
+    """The file format, from --format or the file extension"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    fmt = {'ndjson': 'jsonl', 'json': 'jsonl', 'pq': 'parquet'}.get(fmt, fmt)
+    if fmt not in TRANSFER_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; use one of {', '.join(TRANSFER_FORMATS)}")
+    return fmt
+
+
+def normalize_timestamp(value) -> Optional[str]:
+    """A date, ISO timestamp or Unix time as 'YYYY-MM-DD HH:MM:SS' UTC, the stored format"""
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)) or str(value).replace('.', '', 1).isdigit():
+        moment = datetime.datetime.fromtimestamp(float(value), datetime.timezone.utc)
+    else:
+        moment = datetime.datetime.fromisoformat(str(value).strip())
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def read_import_rows(path: str, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """(line number, row) pairs, read lazily"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        elif fmt == 'jsonl':
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_number, None
+        else:
+            raise ValueError("Import reads CSV or JSONL")
+
+
+def import_row(row: Dict, created_by: str, now: str) -> Tuple:
+    """The alerts row for one imported record; raises ValueError if it's unusable"""
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    def field(name: str) -> str:
+        value = row.get(name)
+        return '' if value is None else str(value).strip()
+
+    title = field('title') or (incident_title(field('location')) if field('location') else '')
+    description = field('description')
+    department = field('department')
+    if not title or not description or not department:
+        raise ValueError("title (or location), description and department are required")
+
+    priority = field('priority').lower()
+    if priority not in PRIORITY_RANKS:
+        priority = rule_based_priority(f"Location: {title}\nDescription: {description}")
+
+    created_at = normalize_timestamp(field('created_at')) or now
+    status = 'resolved' if field('status').lower() == 'resolved' else 'active'
+    resolved_at = resolved_by = None
+    if status == 'resolved':
+        resolved_at = normalize_timestamp(field('resolved_at')) or created_at
+        resolved_by = field('resolved_by') or None
+
+    return (
+        title, description, department, priority, priority_rank(priority),
+        field('alert_type') or 'imported', field('media_path') or None,
+        field('created_by') or created_by, created_at, status, resolved_at, resolved_by
+    )
+
+
+def _insert_batch(conn: sqlite3.Connection, rows: List[Tuple]):
+    trigger_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (DEFERRED_TRIGGER,)
+    ).fetchone()
+    if trigger_sql:
+        conn.execute(f'DROP TRIGGER {DEFERRED_TRIGGER}')
+    first_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM alerts').fetchone()[0]
+    conn.executemany(IMPORT_INSERT_SQL, rows)
+    conn.execute(IMPORT_HISTORY_SQL, (first_id,))
+    # The per-row bookkeeping insert_alert does: only active alerts are
+    # candidates for duplicate detection, any alert may reference media
+    indexed = conn.execute(IMPORT_INDEXED_SQL, (first_id,)).fetchall()
+    for alert_id, title, description, status, media_path in indexed:
+        if status == 'active':
+            index_alert_signature(conn, alert_id, compute_minhash(title, description))
+        add_media_refs(conn, alert_id, media_path)
+    if trigger_sql:
+        conn.execute(IMPORT_EVENTS_SQL, (first_id,))
+        # Same transaction: no other writer ever sees the table without it
+        conn.execute(trigger_sql[0])
+
+
+def import_alerts(path: str, fmt: Optional[str] = None, created_by: str = 'import',
+                  batch_rows: int = IMPORT_BATCH_ROWS) -> Dict:
+    """Bulk-load alerts from a CSV or JSONL file; returns counts and timing"""
+    return import_records(read_import_rows(path, transfer_format(path, fmt)), created_by, batch_rows)
+
+
+def import_records(records: Iterator[Tuple[int, Dict]], created_by: str = 'import',
+                   batch_rows: int = IMPORT_BATCH_ROWS) -> Dict:
+    """Bulk-load (line number, record) pairs, as read_import_rows yields them"""
+    now = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    pool = get_db_pool()
+    started = time.perf_counter()
+    imported = skipped = 0
+    errors = []
+
+    with pool.transaction() as conn:
+        dropped = defer_indexes(conn, IMPORT_DEFERRED_INDEX_TABLES)
+    try:
+        while True:
+            batch = []
+            for line_number, row in itertools.islice(records, batch_rows):
+                try:
+                    batch.append(import_row(row, created_by, now))
+                except ValueError as e:
+                    skipped += 1
+                    if len(errors) < IMPORT_MAX_ERRORS_REPORTED:
+                        errors.append(f"line {line_number}: {e}")
+            if not batch:
+                break
+            with pool.transaction() as conn:
+                _insert_batch(conn, batch)
+                touch_deferred_indexes(conn, dropped)
+            imported += len(batch)
+    finally:
+        index_started = time.perf_counter()
+        with pool.transaction() as conn:
+            restore_deferred_indexes(conn)
+        with pool.connection() as conn:
+            conn.execute('PRAGMA optimize')
+        index_seconds = time.perf_counter() - index_started
+
+    elapsed = time.perf_counter() - started
+    return {
+        'imported': imported,
+        'skipped': skipped,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'index_rebuild_seconds': round(index_seconds, 3),
+        'rows_per_second': round(imported / elapsed, 1) if elapsed else 0.0,
+        'deferred_indexes': dropped,
+    }
+
+
+def iter_resolved_alerts(since: Optional[str] = None, until: Optional[str] = None,
+                         department: Optional[str] = None,
+                         fetch_rows: int = EXPORT_FETCH_ROWS) -> Iterator[List[Tuple]]:
+    """Resolved alerts in resolved_at order, as batches of EXPORT_COLUMNS tuples.
+
+    Rows are stepped off one open cursor (a single read snapshot under WAL),
+    so nothing but the current batch is held in memory.
+    """
+    conditions = ["status = 'resolved'"]
+    params = []
+    if department:
+        conditions.append('department = ?')
+        params.append(department)
+    if since:
+        conditions.append(f'{RESOLVED_ORDER} >= ?')
+        params.append(normalize_timestamp(since))
+    if until:
+        conditions.append(f'{RESOLVED_ORDER} < ?')
+        params.append(normalize_timestamp(until))
+
+    with get_db_pool().connection() as conn:
+        cursor = conn.execute(f'''
+            SELECT {', '.join(EXPORT_COLUMNS)} FROM alerts
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {RESOLVED_ORDER}, id
+        ''', params)
+        try:
+            while True:
+                batch = cursor.fetchmany(fetch_rows)
+                if not batch:
+                    return
+                yield batch
+        finally:
+            cursor.close()
+
+
+def write_csv(path: str, batches: Iterator[List[Tuple]]) -> int:
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in batches:
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def write_jsonl(path: str, batches: Iterator[List[Tuple]]) -> int:
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for batch in batches:
+            f.writelines(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in batch)
+            count += len(batch)
+    return count
+
+
+def write_parquet(path: str, batches: Iterator[List[Tuple]]) -> int:
+    """One row group per fetched batch"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        (column, pa.int64() if column == 'id' else pa.string()) for column in EXPORT_COLUMNS
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            count += len(batch)
+    return count
+
+
+EXPORT_WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'parquet': write_parquet}
+
+
+def export_resolved_alerts(path: str, fmt: Optional[str] = None, since: Optional[str] = None,
+                           until: Optional[str] = None, department: Optional[str] = None) -> Dict:
+    """Write resolved alerts in a date range to CSV, JSONL or Parquet; returns counts and timing"""
+    fmt = transfer_format(path, fmt)
+    started = time.perf_counter()
+    count = EXPORT_WRITERS[fmt](path, iter_resolved_alerts(since, until, department))
+    elapsed = time.perf_counter() - started
+    return {
+        'exported': count,
+        'path': path,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(count / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='bulk-load alerts from CSV or JSONL')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=['csv', 'jsonl'])
+    import_parser.add_argument('--created-by', default='import', help='reporter for rows that name none')
+    import_parser.add_argument('--batch-rows', type=int, default=IMPORT_BATCH_ROWS)
+
+    export_parser = commands.add_parser('export', help='stream resolved alerts to a file')
+    export_parser.add_argument('path')
+    export_parser.add_argument('--format', choices=TRANSFER_FORMATS)
+    export_parser.add_argument('--since', help='resolved at or after (ISO date/time, UTC)')
+    export_parser.add_argument('--until', help='resolved before (ISO date/time, UTC)')
+    export_parser.add_argument('--department')
+    args = parser.parse_args()
+
+    init_db()
+    try:
+        if args.command == 'import':
+            result = import_alerts(args.path, args.format, args.created_by, args.batch_rows)
+        else:
+            result = export_resolved_alerts(args.path, args.format, args.since, args.until, args.department)
+    except (OSError, ValueError, RuntimeError) as e:
+        sys.exit(f"{args.command} failed: {e}")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
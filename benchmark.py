@@ -0,0 +1,323 @@
+"""Data-layer benchmarks on reproducible synthetic alert databases.
+
+Builds a database per size (seeded, so every run and every commit sees the
+same data), then times the alert data functions and writes the results as
+JSON:
+
+    python benchmark.py run --sizes 1000 100000 1000000 --output bench-main.json
+    python benchmark.py compare bench-main.json bench-branch.json
+
+Each size is benchmarked in a fresh process against a copy of the built
+database, with EMERGENCY_JOB_WORKERS=0 so no background work competes.
+Read functions are timed twice: "cold" invalidates the shared read cache
+before every call, so each call runs its query; "warm" repeats the calls and
+is served from the cache, as reruns of an unchanged dashboard are. Writes
+(create_alert, resolve_alert) only have a cold mode. Every mode reports
+p50/p95/p99 and mean latency in milliseconds and sequential calls per
+second. The OS page cache is not dropped between runs, so "cold" means cold
+application caches, not cold disk.
+
+compare prints the p50 and p95 ratio of every function and exits with status
+1 if any got slower than --threshold.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+DEFAULT_ITERATIONS = 200
+DEFAULT_SEED = 42
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "emergency_alerts_bench")
+PAGE_SIZE = 25
+
+# Synthetic data shape: most incidents are long resolved, a minority are open
+ACTIVE_SHARE = 0.2
+PRIORITY_WEIGHTS = {'high': 0.15, 'medium': 0.35, 'low': 0.5}
+DEPARTMENT_WEIGHTS = {'Fire': 0.3, 'Health Care': 0.25, 'Equipment Damage': 0.2, 'Missing Items': 0.1, 'General': 0.15}
+HISTORY_DAYS = 365
+PLACES = ["Warehouse", "Lab", "Kitchen", "Server room", "Car park", "Lobby", "Workshop", "Office"]
+EVENTS = [
+    "smoke coming from a socket", "person collapsed near the entrance", "forklift hit the racking",
+    "laptop missing from desk", "water leaking from the ceiling", "strong smell of gas",
+    "broken glass on the stairs", "fire alarm sounding with no visible cause",
+]
+# The scopes reads are spread over: every department head plus an administrator
+SCOPES = [(department, 'department_head') for department in DEPARTMENT_WEIGHTS] + [('Fire', 'admin')]
+
+
+def synthetic_records(rows: int, seed: int):
+    """(line number, record) pairs for alert_transfer.import_records"""
+    rng = random.Random(seed)
+    end = datetime.datetime(2025, 1, 1)
+    departments, department_weights = zip(*DEPARTMENT_WEIGHTS.items())
+    priorities, priority_weights = zip(*PRIORITY_WEIGHTS.items())
+    for i in range(rows):
+        created = end - datetime.timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+        record = {
+            'location': f"{rng.choice(PLACES)} {rng.randint(1, 20)}",
+            'description': f"{rng.choice(EVENTS)} (report {i})",
+            'department': rng.choices(departments, department_weights)[0],
+            'priority': rng.choices(priorities, priority_weights)[0],
+            'alert_type': rng.choice(['photo', 'audio', 'photo + audio']),
+            'created_by': f"employee{rng.randint(1, 200)}",
+            'created_at': created.isoformat(sep=' '),
+            'status': 'active',
+        }
+        if rng.random() >= ACTIVE_SHARE:
+            resolved = created + datetime.timedelta(minutes=rng.randint(5, 72 * 60))
+            record.update(status='resolved', resolved_at=min(resolved, end).isoformat(sep=' '),
+                          resolved_by=f"{record['department'].split()[0].lower()}_head")
+        yield i + 1, record
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency percentiles (nearest rank) in ms and sequential calls per second"""
+    ordered = sorted(samples)
+    percentile = lambda p: ordered[min(int(p * len(ordered)), len(ordered) - 1)] * 1000
+    total = sum(samples)
+    return {
+        'n': len(samples),
+        'p50_ms': round(percentile(0.50), 4),
+        'p95_ms': round(percentile(0.95), 4),
+        'p99_ms': round(percentile(0.99), 4),
+        'mean_ms': round(total / len(samples) * 1000, 4),
+        'qps': round(len(samples) / total, 1) if total else None,
+    }
+
+
+def time_calls(call: Callable[[int], object], iterations: int, before: Callable[[], None] = None) -> List[float]:
+    samples = []
+    for i in range(iterations):
+        if before:
+            before()
+        started = time.perf_counter()
+        call(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def build_database(rows: int, seed: int) -> Dict:
+    """Worker: create the synthetic database at EMERGENCY_ALERTS_DB"""
+    import whisper_llama3 as app
+    from alert_transfer import import_records
+
+    app.init_db()
+    result = import_records(synthetic_records(rows, seed), created_by='bench')
+    with app.get_db_pool().connection() as conn:
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return result
+
+
+def run_benchmarks(rows: int, iterations: int, seed: int) -> Dict:
+    """Worker: time the data functions against the database at EMERGENCY_ALERTS_DB"""
+    import whisper_llama3 as app
+
+    app.init_db()
+    cache = app.get_alert_cache()
+    rng = random.Random(seed)
+
+    # Cursors into the middle of each list, so deep pages are exercised too
+    deep_active, deep_resolved = {}, {}
+    with app.get_db_pool().connection() as conn:
+        for department, role in SCOPES:
+            scope, params = app._department_scope(department, role)
+            deep_active[(department, role)] = conn.execute(f'''
+                SELECT priority_rank, created_at, id FROM alerts WHERE {scope}status = 'active'
+                ORDER BY priority_rank, created_at DESC, id DESC
+                LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM alerts WHERE {scope}status = 'active')
+            ''', params + params).fetchone()
+            deep_resolved[(department, role)] = conn.execute(f'''
+                SELECT {app.RESOLVED_ORDER}, id FROM alerts WHERE {scope}status = 'resolved'
+                ORDER BY {app.RESOLVED_ORDER} DESC, id DESC
+                LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM alerts WHERE {scope}status = 'resolved')
+            ''', params + params).fetchone()
+    latest_seq = app.latest_alert_event_seq()
+
+    scope = lambda i: SCOPES[i % len(SCOPES)]
+    reads = {
+        'get_alerts': lambda i: app.get_alerts(*scope(i), PAGE_SIZE),
+        'get_alerts_deep_page': lambda i: app.get_alerts(*scope(i), PAGE_SIZE, deep_active[scope(i)]),
+        'get_resolved_alerts': lambda i: app.get_resolved_alerts(*scope(i), PAGE_SIZE),
+        'get_resolved_alerts_deep_page': lambda i: app.get_resolved_alerts(*scope(i), PAGE_SIZE, deep_resolved[scope(i)]),
+        'get_alert_counts': lambda i: app.get_alert_counts(*scope(i)),
+        'get_alert_events': lambda i: app.get_alert_events(*scope(i), latest_seq),
+    }
+
+    results = {}
+    for name, call in reads.items():
+        cold = time_calls(call, iterations, before=cache.bump)
+        warm = time_calls(call, iterations)
+        results[name] = {
+            'first_call_ms': round(cold[0] * 1000, 4),
+            'cold': summarize(cold),
+            'warm': summarize(warm),
+        }
+
+    departments = list(DEPARTMENT_WEIGHTS)
+    def create(i):
+        if not app.create_alert({
+            'title': f"Incident at {rng.choice(PLACES)} {i}",
+            'description': f"{rng.choice(EVENTS)} (benchmark {i})",
+            'department': departments[i % len(departments)],
+            'priority': rng.choice(list(PRIORITY_WEIGHTS)),
+            'alert_type': 'photo',
+            'created_by': 'bench',
+        }):
+            raise RuntimeError("create_alert failed")
+    create_samples = time_calls(create, iterations)
+    results['create_alert'] = {'first_call_ms': round(create_samples[0] * 1000, 4), 'cold': summarize(create_samples)}
+
+    with app.get_db_pool().connection() as conn:
+        active_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM alerts WHERE status = 'active' ORDER BY id LIMIT ?", (iterations,)
+        )]
+    if active_ids:
+        def resolve(i):
+            if not app.resolve_alert(active_ids[i], 'bench_head'):
+                raise RuntimeError("resolve_alert failed")
+        resolve_samples = time_calls(resolve, len(active_ids))
+        results['resolve_alert'] = {'first_call_ms': round(resolve_samples[0] * 1000, 4), 'cold': summarize(resolve_samples)}
+
+    return results
+
+
+def run_worker(mode: str, db_path: str, rows: int, iterations: int, seed: int) -> Dict:
+    """Run a build or benchmark step in a fresh interpreter against db_path"""
+    env = dict(os.environ, EMERGENCY_ALERTS_DB=db_path, EMERGENCY_JOB_WORKERS="0", EMERGENCY_MEDIA_SERVER="0")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "worker", mode,
+         "--rows", str(rows), "--iterations", str(iterations), "--seed", str(seed)],
+        env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> Dict:
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'seed': args.seed,
+        'sizes': {},
+    }
+    for rows in args.sizes:
+        template = os.path.join(args.data_dir, f"alerts-{rows}-seed{args.seed}.db")
+        build = None
+        if not os.path.exists(template):
+            print(f"building {rows} rows...", file=sys.stderr)
+            partial = template + ".building"
+            if os.path.exists(partial):
+                os.remove(partial)
+            build = run_worker("build", partial, rows, args.iterations, args.seed)
+            os.replace(partial, template)
+
+        # Writes change the data, so every run starts from a pristine copy
+        fd, db_path = tempfile.mkstemp(dir=args.data_dir, suffix=".db")
+        os.close(fd)
+        try:
+            shutil.copyfile(template, db_path)
+            print(f"benchmarking {rows} rows...", file=sys.stderr)
+            report['sizes'][str(rows)] = {
+                'build': build,
+                'functions': run_worker("run", db_path, rows, args.iterations, args.seed),
+            }
+        finally:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+    return report
+
+
+def compare(base: Dict, new: Dict, threshold: float) -> List[str]:
+    """Print p50/p95 ratios (new / base); returns the regressions beyond threshold"""
+    print(f"{'rows':>8}  {'function':<30} {'mode':<5} {'p50 ms':>18} {'p95 ms':>18}")
+    regressions = []
+    for rows, size in new['sizes'].items():
+        base_functions = base['sizes'].get(rows, {}).get('functions', {})
+        for name, modes in size['functions'].items():
+            for mode in ('cold', 'warm'):
+                if mode not in modes or mode not in base_functions.get(name, {}):
+                    continue
+                columns = []
+                for stat in ('p50_ms', 'p95_ms'):
+                    before, after = base_functions[name][mode][stat], modes[mode][stat]
+                    ratio = after / before if before else 1.0
+                    columns.append(f"{after:8.3f} ({ratio:4.2f}x)")
+                    if ratio > threshold:
+                        regressions.append(f"{rows} rows {name} {mode} {stat}: {before:.3f} -> {after:.3f} ms")
+                print(f"{rows:>8}  {name:<30} {mode:<5} {columns[0]:>18} {columns[1]:>18}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='build the datasets and time the data functions')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    run_parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    run_parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    run_parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='where built databases are kept for reuse')
+    run_parser.add_argument('--output', default='benchmark-results.json')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio that counts as a regression')
+
+    worker_parser = commands.add_parser('worker')
+    worker_parser.add_argument('mode', choices=['build', 'run'])
+    worker_parser.add_argument('--rows', type=int, required=True)
+    worker_parser.add_argument('--iterations', type=int, required=True)
+    worker_parser.add_argument('--seed', type=int, required=True)
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        if args.mode == 'build':
+            result = build_database(args.rows, args.seed)
+        else:
+            result = run_benchmarks(args.rows, args.iterations, args.seed)
+        print(json.dumps(result))
+    elif args.command == 'run':
+        report = run(args)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}", file=sys.stderr)
+    else:
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold)
+        if regressions:
+            print("\nregressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
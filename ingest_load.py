@@ -0,0 +1,169 @@
+"""Load generator for ingest_server.py.
+
+Posts synthetic sensor alerts over a few keep-alive connections and reports
+the ingestion rate and request latency:
+
+    python ingest_load.py --alerts 20000 --batch 50 --connections 8
+    python ingest_load.py --alerts 200 --batch 1 --image photo.jpg
+
+Point it at a scratch database (EMERGENCY_ALERTS_DB) unless you want the
+alerts on the dashboard. Alerts are tagged with source "load-test".
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+SENSOR_EVENTS = [
+    ("Fire", "Smoke detector triggered on floor {n}, zone {z}"),
+    ("Fire", "Heat sensor above threshold in server room {n}"),
+    ("Equipment Damage", "Door controller {n} reports forced entry at gate {z}"),
+    ("Missing Items", "Asset tag {n} left the building through exit {z}"),
+    ("General", "Access card {n} denied three times at door {z}"),
+]
+
+
+def synthetic_alert(index: int, media: Optional[str] = None) -> Dict:
+    department, template = SENSOR_EVENTS[index % len(SENSOR_EVENTS)]
+    n, z = random.randint(1, 40), random.randint(1, 12)
+    alert = {
+        'location': f"Building {index % 7 + 1}",
+        'description': template.format(n=n, z=z) + f" (event {uuid.uuid4().hex[:8]})",
+        'department': department,
+        'priority': random.choice(['high', 'medium', 'low']),
+        'source': "load-test",
+    }
+    if media:
+        alert['media'] = [media]
+    return alert
+
+
+def encode_request(alerts: List[Dict], host: str, token: str,
+                   image: Optional[Tuple[str, bytes]] = None) -> bytes:
+    if image is None:
+        body = json.dumps(alerts).encode()
+        content_type = "application/json"
+    else:
+        boundary = uuid.uuid4().hex
+        filename, data = image
+        body = b"".join([
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"alerts\"\r\n"
+            f"Content-Type: application/json\r\n\r\n".encode(),
+            json.dumps(alerts).encode(),
+            f"\r\n--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; "
+            f"filename=\"{filename}\"\r\n\r\n".encode(),
+            data,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ])
+        content_type = f"multipart/form-data; boundary={boundary}"
+
+    headers = [
+        "POST /alerts HTTP/1.1",
+        f"Host: {host}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+    ]
+    if token:
+        headers.append(f"Authorization: Bearer {token}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode() + body
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, Dict]:
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def run_connection(args, requests: asyncio.Queue, results: Dict, image: Optional[Tuple[str, bytes]]):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        while True:
+            try:
+                alerts = requests.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            request = encode_request(alerts, args.host, args.token, image)
+            while True:
+                started = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status, payload = await read_response(reader)
+                results['latencies'].append(time.perf_counter() - started)
+                if status != 503:
+                    break
+                results['retries'] += 1
+                await asyncio.sleep(0.05)
+            if status == 201:
+                results['alerts'] += len(payload['ids'])
+            else:
+                results['errors'].append(f"{status}: {payload.get('error')}")
+    finally:
+        writer.close()
+
+
+async def run_load(args) -> Dict:
+    image = None
+    if args.image:
+        with open(args.image, "rb") as f:
+            image = (os.path.basename(args.image), f.read())
+
+    requests = asyncio.Queue()
+    for start in range(0, args.alerts, args.batch):
+        count = min(args.batch, args.alerts - start)
+        requests.put_nowait([
+            synthetic_alert(start + i, "image" if image else None) for i in range(count)
+        ])
+
+    results = {'alerts': 0, 'retries': 0, 'errors': [], 'latencies': []}
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_connection(args, requests, results, image) for _ in range(args.connections)
+    ))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(results['latencies']) or [0.0]
+    percentile = lambda p: latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000
+    return {
+        'alerts': results['alerts'],
+        'seconds': round(elapsed, 3),
+        'alerts_per_second': round(results['alerts'] / elapsed, 1),
+        'requests': len(results['latencies']),
+        'retries_503': results['retries'],
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies) * 1000, 2),
+            'p50': round(percentile(0.50), 2),
+            'p95': round(percentile(0.95), 2),
+            'p99': round(percentile(0.99), 2),
+        },
+        'errors': results['errors'][:10],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8503)
+    parser.add_argument("--token", default=os.environ.get("EMERGENCY_INGEST_TOKEN", ""))
+    parser.add_argument("--alerts", type=int, default=5000, help="total alerts to post")
+    parser.add_argument("--batch", type=int, default=50, help="alerts per request")
+    parser.add_argument("--connections", type=int, default=8, help="concurrent keep-alive connections")
+    parser.add_argument("--image", help="attach this image to every request")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run_load(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
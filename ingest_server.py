@@ -0,0 +1,467 @@
+"""Headless HTTP ingestion of machine-generated alerts.
+
+Smoke detectors, access control and other systems post alerts here instead of
+going through the Streamlit form. Alerts are written by the app's own data
+layer (create_alerts), so they get duplicate signatures, media references,
+history and enrichment jobs exactly like reports from the form, and the
+dashboard picks them up through the change feed.
+
+    POST /alerts   application/json: one alert object or a list of them
+                   multipart/form-data: the same JSON in an "alerts" part, plus
+                   file parts that alerts name in their "media" list
+    GET  /health   queue depth and commit counters
+
+An alert has a title (or location), description and department, and
+optionally priority, source and media. Without a priority the keyword rules
+decide and the LLM review job refines it later, as for slow form submissions.
+The response is 201 with {"ids": [...]} in request order.
+
+All alerts of a request are committed in one transaction. Requests that queue
+up while a commit is running are committed together in the next one (group
+commit). When the queue is full, or request bodies being read already add
+up to INGEST_MAX_BUFFERED_BYTES, the server answers 503 with Retry-After
+before reading the request body or storing its media, rather than buffering
+without bound.
+
+    EMERGENCY_INGEST_TOKEN=... python ingest_server.py --port 8503
+
+With EMERGENCY_INGEST_TOKEN set, requests must send it as a bearer token.
+Run with EMERGENCY_JOB_WORKERS=0 if the app's process should do the
+enrichment; queued jobs are picked up by whichever workers poll first.
+"""
+import argparse
+import asyncio
+import email.message
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from whisper_llama3 import (
+    DEPARTMENTS, MEDIA_LIMITS, PRIORITY_RANKS, MediaLimitError, create_alerts, incident_title,
+    init_db, iter_bytes_chunks, rule_based_priority, save_media
+)
+
+logger = logging.getLogger(__name__)
+
+INGEST_TOKEN = os.environ.get("EMERGENCY_INGEST_TOKEN", "")
+# Alert requests waiting for the writer; beyond this clients are told to retry
+INGEST_QUEUE_MAX_REQUESTS = 256
+# Alerts committed in one transaction when requests are grouped
+INGEST_GROUP_MAX_ALERTS = 1000
+INGEST_MAX_BATCH_ALERTS = 1000
+INGEST_MAX_BODY_BYTES = sum(limits['max_bytes'] for limits in MEDIA_LIMITS.values()) + 1024 * 1024
+# Request bodies held in memory at once, across connections; beyond this
+# clients are told to retry
+INGEST_MAX_BUFFERED_BYTES = 4 * INGEST_MAX_BODY_BYTES
+INGEST_RETRY_AFTER_SECONDS = 1
+MAX_HEADER_LINES = 100
+DISCARD_CHUNK_BYTES = 64 * 1024
+
+MEDIA_EXTENSIONS = {
+    'image': ('jpg', 'jpeg', 'png', 'webp'),
+    'audio': ('wav', 'mp3', 'm4a', 'ogg', 'webm'),
+}
+ALERT_TYPE_NAMES = {'image': 'photo', 'audio': 'audio'}
+
+STATUS_REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 411: "Length Required", 413: "Content Too Large",
+    414: "URI Too Long", 415: "Unsupported Media Type", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class IngestError(Exception):
+    """A request the server answers with an error status instead of alert ids"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def header_params(value: str, header: str = "content-type") -> email.message.Message:
+    """Parse a header value with parameters (boundary=..., name=...)"""
+    message = email.message.Message()
+    message[header] = value
+    return message
+
+
+def parse_multipart(body: bytes, content_type: str) -> Dict[str, Dict]:
+    """Parts of a multipart/form-data body by field name.
+
+    Part data are memoryviews into body, so files are not copied.
+    """
+    boundary = header_params(content_type).get_param("boundary")
+    if not boundary:
+        raise IngestError(400, "multipart body without boundary")
+    delimiter = b"--" + boundary.encode("latin-1")
+    view = memoryview(body)
+    parts = {}
+
+    position = body.find(delimiter)
+    if position < 0:
+        raise IngestError(400, "multipart boundary not found")
+    while True:
+        position += len(delimiter)
+        if body[position:position + 2] == b"--":
+            return parts
+        header_end = body.find(b"\r\n\r\n", position)
+        part_end = body.find(b"\r\n" + delimiter, header_end + 4)
+        if header_end < 0 or part_end < 0:
+            raise IngestError(400, "truncated multipart body")
+
+        headers = {}
+        for line in body[position:header_end].decode("latin-1").split("\r\n"):
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        disposition = header_params(headers.get("content-disposition", ""), "content-disposition")
+        name = disposition.get_param("name", header="content-disposition")
+        if name:
+            parts[name] = {
+                'filename': disposition.get_param("filename", header="content-disposition") or "",
+                'content_type': headers.get("content-type", ""),
+                'data': view[header_end + 4:part_end],
+            }
+        position = part_end + 2
+
+
+def media_kind(part: Dict) -> Tuple[str, str]:
+    """(file type, extension) of an uploaded file part"""
+    extension = os.path.splitext(part['filename'])[1].lstrip(".").lower()
+    major = part['content_type'].split("/")[0].lower()
+    for kind, extensions in MEDIA_EXTENSIONS.items():
+        if major == kind or extension in extensions:
+            return kind, extension or extensions[0]
+    raise IngestError(415, f"unsupported media type for {part['filename'] or 'file part'}")
+
+
+def parse_alerts(payload) -> List[Dict]:
+    """Validated alerts from a JSON payload; raises IngestError(400)"""
+    if isinstance(payload, dict) and isinstance(payload.get("alerts"), list):
+        payload = payload["alerts"]
+    alerts = payload if isinstance(payload, list) else [payload]
+    if not alerts:
+        raise IngestError(400, "no alerts in request")
+    if len(alerts) > INGEST_MAX_BATCH_ALERTS:
+        raise IngestError(413, f"at most {INGEST_MAX_BATCH_ALERTS} alerts per request")
+
+    for index, alert in enumerate(alerts):
+        where = f"alert {index}"
+        if not isinstance(alert, dict):
+            raise IngestError(400, f"{where}: expected an object")
+        title = alert.get("title") or (incident_title(alert["location"]) if alert.get("location") else "")
+        if not isinstance(title, str) or not title.strip():
+            raise IngestError(400, f"{where}: title or location is required")
+        if not isinstance(alert.get("description"), str) or not alert["description"].strip():
+            raise IngestError(400, f"{where}: description is required")
+        if alert.get("department") not in DEPARTMENTS:
+            raise IngestError(400, f"{where}: department must be one of {', '.join(DEPARTMENTS)}")
+        if alert.get("priority") is not None and alert["priority"] not in PRIORITY_RANKS:
+            raise IngestError(400, f"{where}: priority must be one of {', '.join(PRIORITY_RANKS)}")
+        media = alert.get("media") or []
+        if not isinstance(media, list) or not all(isinstance(name, str) for name in media):
+            raise IngestError(400, f"{where}: media must be a list of file part names")
+        alert["title"] = title.strip()
+        alert["media"] = media
+    return alerts
+
+
+def build_alert_data(alert: Dict, stored: Dict[str, Tuple[str, str]]) -> Dict:
+    """The create_alerts record for a validated alert and its stored media"""
+    media = [stored[name] for name in alert["media"]]
+    kinds = []
+    for kind, _ in media:
+        if ALERT_TYPE_NAMES[kind] not in kinds:
+            kinds.append(ALERT_TYPE_NAMES[kind])
+
+    if alert.get("priority"):
+        priority, priority_source = alert["priority"], 'device'
+    else:
+        prompt = f"Location: {alert['title']}\nDescription: {alert['description']}"
+        priority, priority_source = rule_based_priority(prompt), 'rules'
+
+    return {
+        'title': alert["title"],
+        'description': alert["description"],
+        'department': alert["department"],
+        'priority': priority,
+        'priority_source': priority_source,
+        'alert_type': alert.get("alert_type") or " + ".join(kinds) or "sensor",
+        'media_path': ",".join(f"{kind}:{path}" for kind, path in media) or None,
+        'created_by': str(alert.get("source") or "ingest")
+    }
+
+
+def store_request_media(alerts: List[Dict], parts: Dict[str, Dict]) -> Dict[str, Tuple[str, str]]:
+    """Store every file part the alerts refer to; {part name: (kind, path)}"""
+    stored = {}
+    for alert in alerts:
+        for name in alert["media"]:
+            if name in stored:
+                continue
+            part = parts.get(name)
+            if part is None or not part['filename']:
+                raise IngestError(400, f"media part {name!r} is missing")
+            kind, extension = media_kind(part)
+            try:
+                path = save_media(iter_bytes_chunks(part['data']), extension, kind, len(part['data']))
+            except MediaLimitError as e:
+                raise IngestError(413, str(e))
+            stored[name] = (kind, path)
+    return stored
+
+
+class GroupCommitWriter:
+    """Single writer that commits queued requests together.
+
+    Each request's alerts stay atomic: if a grouped commit fails, its requests
+    are retried in a transaction each so one bad request doesn't fail the rest.
+    """
+
+    def __init__(self, max_requests: int = INGEST_QUEUE_MAX_REQUESTS,
+                 group_max_alerts: int = INGEST_GROUP_MAX_ALERTS):
+        self.group_max_alerts = group_max_alerts
+        self._queue = asyncio.Queue(maxsize=max_requests)
+        self.committed_alerts = 0
+        self.commits = 0
+        self.rejected = 0
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def busy_error(self, reason: str = "ingestion queue is full") -> IngestError:
+        """The 503 for a request turned away because the server is saturated"""
+        self.rejected += 1
+        return IngestError(503, reason, {"Retry-After": str(INGEST_RETRY_AFTER_SECONDS)})
+
+    async def submit(self, batch: List[Dict]) -> List[int]:
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((batch, future))
+        except asyncio.QueueFull:
+            raise self.busy_error()
+        return await future
+
+    async def run(self):
+        while True:
+            group = [await self._queue.get()]
+            size = len(group[0][0])
+            while size < self.group_max_alerts and not self._queue.empty():
+                group.append(self._queue.get_nowait())
+                size += len(group[-1][0])
+
+            results = await asyncio.to_thread(self._commit, [batch for batch, _ in group])
+            for (_, future), result in zip(group, results):
+                if future.cancelled():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _commit(self, batches: List[List[Dict]]) -> List:
+        try:
+            alert_ids = create_alerts([alert for batch in batches for alert in batch])
+            self.commits += 1
+        except Exception as e:
+            if len(batches) == 1:
+                logger.error(f"Error ingesting {len(batches[0])} alerts: {e}")
+                return [e]
+            return [self._commit([batch])[0] for batch in batches]
+
+        self.committed_alerts += len(alert_ids)
+        results = []
+        for batch in batches:
+            results.append(alert_ids[:len(batch)])
+            alert_ids = alert_ids[len(batch):]
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self._queue.qsize(),
+            'commits': self.commits,
+            'committed_alerts': self.committed_alerts,
+            'rejected': self.rejected,
+        }
+
+
+class IngestServer:
+    def __init__(self, token: str = INGEST_TOKEN):
+        self.token = token
+        self.writer = GroupCommitWriter()
+        # Bytes of request bodies being read or handled right now
+        self.buffered_bytes = 0
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except ValueError:
+                    # Longer than the stream's line limit (64 KiB)
+                    self._respond(writer, 414, {'error': "request line too long"}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if not request_line.strip():
+                    break
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line: bytes, reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter) -> bool:
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            self._respond(writer, 400, {'error': "malformed request line"}, keep_alive=False)
+            return False
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            try:
+                line = await reader.readline()
+            except ValueError:
+                self._respond(writer, 431, {'error': "header line too long"}, keep_alive=False)
+                return False
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            # The rest of the header block is unread, so the connection can't be reused
+            self._respond(writer, 431, {'error': f"more than {MAX_HEADER_LINES} header lines"}, keep_alive=False)
+            return False
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+        try:
+            length = self._content_length(headers)
+            if length > INGEST_MAX_BODY_BYTES:
+                # The body is not read, so the connection can't be reused
+                keep_alive = False
+                raise IngestError(413, f"request body is limited to {INGEST_MAX_BODY_BYTES} bytes")
+            busy = None
+            if method == "POST" and target.split("?")[0] == "/alerts" and self.writer.full():
+                busy = "ingestion queue is full"
+            elif self.buffered_bytes + length > INGEST_MAX_BUFFERED_BYTES:
+                busy = "too many request bodies in flight"
+            if busy:
+                # Turn the request away before its body is buffered; skipping the
+                # body in small reads keeps the connection usable for the retry
+                await self._discard(reader, length)
+                raise self.writer.busy_error(busy)
+            # Reserved before reading, so slow uploads count while they trickle in
+            self.buffered_bytes += length
+            try:
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method, target.split("?")[0], headers, body)
+            finally:
+                self.buffered_bytes -= length
+            extra_headers = {}
+        except IngestError as e:
+            status, payload, extra_headers = e.status, {'error': str(e)}, e.headers
+        except Exception as e:
+            logger.exception("Error handling ingestion request")
+            status, payload, extra_headers = 500, {'error': str(e)}, {}
+
+        self._respond(writer, status, payload, extra_headers, keep_alive)
+        return keep_alive
+
+    @staticmethod
+    async def _discard(reader: asyncio.StreamReader, length: int):
+        while length:
+            length -= len(await reader.readexactly(min(length, DISCARD_CHUNK_BYTES)))
+
+    @staticmethod
+    def _content_length(headers: Dict[str, str]) -> int:
+        if "transfer-encoding" in headers:
+            raise IngestError(411, "chunked bodies are not supported; send Content-Length")
+        value = headers.get("content-length", "0")
+        if not value.isdigit():
+            raise IngestError(400, "invalid Content-Length")
+        return int(value)
+
+    def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Dict,
+                 headers: Optional[Dict] = None, keep_alive: bool = True):
+        body = json.dumps(payload).encode()
+        lines = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}",
+                 "Content-Type: application/json",
+                 f"Content-Length: {len(body)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+        if path == "/health":
+            return 200, dict(self.writer.stats(), buffered_bytes=self.buffered_bytes)
+        if path != "/alerts":
+            raise IngestError(404, "not found")
+        if method != "POST":
+            raise IngestError(405, "use POST")
+        if self.token and not hmac.compare_digest(headers.get("authorization", ""), f"Bearer {self.token}"):
+            raise IngestError(401, "missing or invalid bearer token")
+
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type == "application/json":
+            parts, alerts_json = {}, body
+        elif content_type == "multipart/form-data":
+            parts = parse_multipart(body, headers["content-type"])
+            if "alerts" not in parts:
+                raise IngestError(400, "multipart body needs an \"alerts\" part")
+            alerts_json = parts["alerts"]['data'].tobytes()
+        else:
+            raise IngestError(415, "send application/json or multipart/form-data")
+
+        try:
+            alerts = parse_alerts(json.loads(alerts_json))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise IngestError(400, f"invalid JSON: {e}")
+
+        if any(alert["media"] for alert in alerts):
+            # Don't store media for alerts the writer would refuse anyway
+            if self.writer.full():
+                raise self.writer.busy_error()
+            stored = await asyncio.to_thread(store_request_media, alerts, parts)
+        else:
+            stored = {}
+        alert_ids = await self.writer.submit([build_alert_data(alert, stored) for alert in alerts])
+        return 201, {'ids': alert_ids}
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        writer_task = asyncio.create_task(self.writer.run())
+        logger.info(f"Ingesting alerts on http://{host}:{port}/alerts")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            writer_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8503)
+    args = parser.parse_args()
+
+    if not INGEST_TOKEN:
+        logger.warning("EMERGENCY_INGEST_TOKEN is not set; anyone who can reach the port can post alerts")
+    init_db()
+    started = time.time()
+    try:
+        asyncio.run(IngestServer().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info(f"Stopped after {time.time() - started:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
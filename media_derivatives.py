@@ -0,0 +1,50 @@
+"""Image derivatives for alert evidence, generated in worker processes.
+
+Kept in its own module so the process pool can import it by name: functions
+defined in the Streamlit script itself live in a rerun-scoped ``__main__``
+and cannot be pickled across processes.
+"""
+import os
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+# Longest edge in pixels, largest first so each size is resized from the previous one
+DERIVATIVE_SIZES = (
+    ('medium', 1280),
+    ('thumb', 320),
+)
+WEBP_QUALITY = 80
+
+
+def derivative_path(image_path: str, size_name: str) -> str:
+    """Where the WebP derivative of an original image is stored"""
+    root, _ = os.path.splitext(image_path)
+    return f"{root}.{size_name}.webp"
+
+
+def generate_image_derivatives(image_path: str) -> Dict[str, str]:
+    """Write the WebP derivatives of an image and return their paths by size name.
+
+    EXIF orientation is applied to the pixels, and the derivatives are saved
+    without EXIF or other metadata (which also drops GPS tags from phone photos).
+    """
+    largest = DERIVATIVE_SIZES[0][1]
+    paths = {}
+    with Image.open(image_path) as original:
+        # JPEG only: decode at a reduced DCT scale that still covers the largest size
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        for size_name, size in DERIVATIVE_SIZES:
+            image.thumbnail((size, size), Image.LANCZOS)
+            path = derivative_path(image_path, size_name)
+            # Write then rename so readers never see a partial file
+            temp_path = f"{path}.tmp"
+            image.save(temp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+            os.replace(temp_path, path)
+            paths[size_name] = path
+
+    return paths
@@ -0,0 +1,243 @@
+"""Signed, cacheable HTTP access to stored media.
+
+Alert cards reference evidence by URL instead of pushing the file bytes
+through the Streamlit websocket on every rerun, so browsers cache images and
+stream audio. URLs carry an expiry and an HMAC signature, which keeps the
+server stateless; responses support byte ranges (audio seeking) and
+ETag/Last-Modified revalidation.
+
+The app starts this server in-process and hands out localhost URLs to
+browsers on the same machine; set MEDIA_URL_BASE to the address other
+browsers reach it by (behind an HTTPS proxy for an HTTPS app), otherwise they
+get media inline. To run it as a sidecar instead, share the media directory
+(the signing secret is kept there, or set MEDIA_URL_SECRET):
+
+    python media_server.py --port 8502
+    EMERGENCY_MEDIA_SERVER=0 MEDIA_URL_BASE=http://host:8502 streamlit run whisper_llama3.py
+"""
+import argparse
+import email.utils
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import re
+import secrets
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SECRET_FILE = ".url_secret"
+COPY_CHUNK_SIZE = 256 * 1024
+URL_PREFIX = "/media/"
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("audio/ogg", ".ogg")
+mimetypes.add_type("audio/mp4", ".m4a")
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def load_url_secret(media_dir: str) -> bytes:
+    """The HMAC key for media URLs, created on first use and shared by all processes"""
+    if os.environ.get("MEDIA_URL_SECRET"):
+        return os.environ["MEDIA_URL_SECRET"].encode()
+
+    path = os.path.join(media_dir, SECRET_FILE)
+    if not os.path.exists(path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        try:
+            # link() fails if another process got there first; theirs wins
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def url_signature(relative_path: str, expires: int, secret: bytes) -> str:
+    message = f"{relative_path}\n{expires}".encode()
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()[:32]
+
+
+def signed_media_path(relative_path: str, expires: int, secret: bytes) -> str:
+    """URL path and query for a file under the media directory, valid until expires"""
+    relative_path = relative_path.replace(os.sep, "/")
+    query = urllib.parse.urlencode({
+        "expires": expires,
+        "sig": url_signature(relative_path, expires, secret)
+    })
+    return f"{URL_PREFIX}{urllib.parse.quote(relative_path)}?{query}"
+
+
+def resolve_media_file(media_dir: str, relative_path: str) -> Optional[str]:
+    """Absolute path of a servable file, or None for anything outside the store"""
+    parts = relative_path.split("/")
+    if any(not part or part.startswith(".") for part in parts) or parts[0] == "tmp":
+        return None
+    path = os.path.realpath(os.path.join(media_dir, *parts))
+    if not path.startswith(media_dir + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single byte range; (size, size) if unsatisfiable.
+
+    Returns None when the whole file should be sent, including for multi-range
+    requests, which a server may answer with the full content.
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return size, size
+    return start, end
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    media_dir = os.path.realpath("media")
+    secret = b""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _send_status(self, status: int, headers: Optional[dict] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _serve(self, send_body: bool):
+        url = urllib.parse.urlsplit(self.path)
+        if not url.path.startswith(URL_PREFIX):
+            self._send_status(404)
+            return
+        relative_path = urllib.parse.unquote(url.path[len(URL_PREFIX):])
+        query = urllib.parse.parse_qs(url.query)
+        expires = query.get("expires", [""])[0]
+        signature = query.get("sig", [""])[0]
+        now = time.time()
+        if not expires.isdigit() or int(expires) < now or not hmac.compare_digest(
+            signature, url_signature(relative_path, int(expires), self.secret)
+        ):
+            self._send_status(403)
+            return
+
+        path = resolve_media_file(self.media_dir, relative_path)
+        if path is None:
+            self._send_status(404)
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        # Stored files never change in place, so size and mtime identify the content
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(stat.st_mtime, usegmt=True),
+            "Cache-Control": f"private, max-age={int(expires) - int(now)}",
+            "Accept-Ranges": "bytes",
+        }
+
+        if self._not_modified(etag, stat.st_mtime):
+            self._send_status(304, headers)
+            return
+
+        byte_range = None
+        if self.headers.get("If-Range") in (None, etag):
+            byte_range = parse_range(self.headers.get("Range"), size)
+        if byte_range == (size, size):
+            headers["Content-Range"] = f"bytes */{size}"
+            self._send_status(416, headers)
+            return
+
+        start, end = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if send_body:
+            self._copy_file(path, start, end - start + 1)
+
+    def _not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def _copy_file(self, path: str, offset: int, length: int):
+        buffer = bytearray(COPY_CHUNK_SIZE)
+        view = memoryview(buffer)
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while length > 0:
+                    n = f.readinto(view[:min(length, COPY_CHUNK_SIZE)])
+                    if not n:
+                        break
+                    self.wfile.write(view[:n])
+                    length -= n
+        except (BrokenPipeError, ConnectionResetError):
+            # Players routinely drop a response once they've seen enough
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def create_media_server(host: str, port: int, media_dir: str, secret: bytes) -> ThreadingHTTPServer:
+    handler = type("BoundMediaRequestHandler", (MediaRequestHandler,), {
+        "media_dir": os.path.realpath(media_dir),
+        "secret": secret,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--media-dir", default="media")
+    args = parser.parse_args()
+
+    server = create_media_server(args.host, args.port, args.media_dir, load_url_secret(args.media_dir))
+    print(f"media server listening on http://{args.host}:{args.port} for {os.path.abspath(args.media_dir)}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Minimal stand-in for the ollama HTTP API, for exercising priority classification.
+
+Answers POST /api/chat with a priority picked by the app's keyword rules, after
+an optional artificial delay so the latency budget and fallback can be tested:
+
+    python ollama_stub.py --port 11435 --delay 3
+    OLLAMA_HOST=http://localhost:11435 streamlit run whisper_llama3.py
+"""
+import argparse
+import datetime
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from whisper_llama3 import rule_based_priority
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    model = "llama3"
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": self.model}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        user_text = " ".join(
+            message.get("content", "")
+            for message in request.get("messages", [])
+            if message.get("role") == "user"
+        )
+
+        time.sleep(self.delay)
+        self._send_json(200, {
+            "model": request.get("model", self.model),
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+            "message": {
+                "role": "assistant",
+                "content": json.dumps({"priority": rule_based_priority(user_text)})
+            },
+            "done": True
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+
+    OllamaStubHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), OllamaStubHandler)
+    print(f"ollama stub listening on http://{args.host}:{args.port} (delay {args.delay}s)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
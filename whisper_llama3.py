@@ -3,29 +3,211 @@ import sqlite3
 import os
 import hashlib
 import datetime
-from PIL import Image
+from media_derivatives import derivative_path, generate_image_derivatives
+from media_server import create_media_server, load_url_secret, signed_media_path
 import io
-import base64
+import binascii
 import tempfile
+import wave
 from typing import Dict, List, Optional, Tuple
 import logging
 import json
+import html
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import multiprocessing
+from contextlib import contextmanager
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create media directory
+# Create media directory. Files are stored by SHA-256 under two levels of
+# shard directories (media/ab/cd/abcd....ext); uploads land in tmp/ first.
 MEDIA_DIR = "media"
-os.makedirs(MEDIA_DIR, exist_ok=True)
+MEDIA_TMP_DIR = os.path.join(MEDIA_DIR, "tmp")
+os.makedirs(MEDIA_TMP_DIR, exist_ok=True)
+MEDIA_CHUNK_SIZE = 1024 * 1024
+# Per-type ingest limits, enforced while the upload streams in
+MEDIA_LIMITS = {
+    'image': {'max_bytes': 20 * 1024 * 1024},
+    'audio': {'max_bytes': 50 * 1024 * 1024, 'max_seconds': 10 * 60},
+}
+# Unreferenced blobs (e.g. discarded recordings) are removed after this long
+MEDIA_GC_MIN_AGE_SECONDS = 24 * 3600
 
-# Alert history for priority determination
+# Browsers fetch media by signed, expiring URLs from media_server.py, which the
+# app runs in-process unless EMERGENCY_MEDIA_SERVER=0 (e.g. when it runs as a
+# sidecar). URL expiries are rounded up to MEDIA_URL_BUCKET_SECONDS so a URL
+# stays the same across reruns and the browser can cache what it fetched.
+# MEDIA_URL_BASE is the server's address as browsers reach it, e.g.
+# https://media.example.org behind a TLS proxy. Without it URLs are only
+# handed to browsers on localhost (where http://localhost:MEDIA_SERVER_PORT
+# works); everyone else gets media inline through Streamlit, as does everyone
+# when the in-process server is disabled or could not bind its port.
+MEDIA_SERVER_ENABLED = os.environ.get("EMERGENCY_MEDIA_SERVER", "1") != "0"
+MEDIA_SERVER_HOST = os.environ.get("MEDIA_SERVER_HOST", "0.0.0.0")
+MEDIA_SERVER_PORT = int(os.environ.get("MEDIA_SERVER_PORT", "8502"))
+MEDIA_URL_BASE = os.environ.get("MEDIA_URL_BASE", "").rstrip("/")
+LOCAL_HOSTNAMES = ("localhost", "127.0.0.1", "[::1]")
+MEDIA_URL_TTL_SECONDS = 3600
+MEDIA_URL_BUCKET_SECONDS = 900
+
+# Audio is normalised at ingest into an Opus/OGG blob for playback plus a
+# 16 kHz mono PCM copy next to it for Whisper. Leading and trailing frames
+# more than AUDIO_SILENCE_RANGE_DB below the loudest frame (and always those
+# under AUDIO_SILENCE_FLOOR_DBFS) are trimmed, keeping a little padding.
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_OPUS_BITRATE = 24000
+AUDIO_SILENCE_FRAME_SECONDS = 0.02
+AUDIO_SILENCE_RANGE_DB = 40
+AUDIO_SILENCE_FLOOR_DBFS = -50
+AUDIO_SILENCE_PAD_SECONDS = 0.25
+
+# Live WebRTC capture is encoded to Opus on the server as frames arrive, at
+# WebRTC's native rate; the finished file is normalised like any other audio
+LIVE_AUDIO_SAMPLE_RATE = 48000
+LIVE_AUDIO_BITRATE = 32000
+
+# Alert history for priority determination. Entries live in the append-only
+# alert_history table; the JSON file is only read once to import old entries.
 ALERT_HISTORY_FILE = "alert_history.json"
+ALERT_HISTORY_TAIL = 100
+
+# SQLite database settings
+DB_PATH = os.environ.get("EMERGENCY_ALERTS_DB", "emergency_alerts.db")
+DB_BUSY_TIMEOUT_MS = 5000
+DB_POOL_MAX_IDLE = 16
+
+# A bulk import refreshes its deferred_indexes heartbeat every batch; init_db
+# only rebuilds indexes whose import has been silent this long (i.e. died)
+DEFERRED_INDEX_STALE_SECONDS = 600
+
+# Applied to every pooled connection. WAL lets readers run alongside the single
+# writer, and NORMAL sync is durable enough in WAL mode while avoiding an fsync
+# per commit. cache_size is negative, i.e. expressed in KiB (32 MB per connection).
+DB_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -32000),
+    ("temp_store", "MEMORY"),
+    ("foreign_keys", "ON"),
+    ("busy_timeout", DB_BUSY_TIMEOUT_MS),
+)
+
+# Departments an incident can be assigned to
+DEPARTMENTS = ["Fire", "Health Care", "Equipment Damage", "Missing Items", "General"]
+
+# Reports give a location; the alert title is this prefix plus the location
+INCIDENT_TITLE_PREFIX = "Incident at "
+
+# Stored sort key for alert priority; unknown priorities sort last
+PRIORITY_RANKS = {'high': 1, 'medium': 2, 'low': 3}
+UNKNOWN_PRIORITY_RANK = 9
+
+# Explicit column list so row positions don't depend on migration order
+ALERT_COLUMNS = (
+    'id', 'title', 'description', 'department', 'priority', 'alert_type',
+    'media_path', 'created_by', 'created_at', 'status', 'resolved_at', 'resolved_by',
+    'priority_rank'
+)
+ALERT_SELECT = ', '.join(ALERT_COLUMNS)
+
+# Sort key of resolved alerts; imported rows may have no resolved_at. Queries
+# must spell it exactly like this to use the expression indexes over it.
+RESOLVED_ORDER = 'COALESCE(resolved_at, created_at)'
+
+# Entries kept by the shared alert read cache
+ALERT_CACHE_MAX_ENTRIES = 1024
+
+# Background job queue
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BASE_SECONDS = 5
+JOB_RETRY_MAX_SECONDS = 300
+JOB_LEASE_SECONDS = 600
+JOB_POLL_SECONDS = 2.0
+# Set EMERGENCY_JOB_WORKERS=0 for processes that should only enqueue (tools, benchmarks)
+JOB_WORKERS_ENABLED = os.environ.get("EMERGENCY_JOB_WORKERS", "1") != "0"
+
+# Whisper transcription of audio evidence
+WHISPER_MODEL_SIZE = os.environ.get("WHISPER_MODEL_SIZE", "base")
+WHISPER_QUANTIZE = os.environ.get("WHISPER_QUANTIZE", "1") != "0"
+WHISPER_LANGUAGE = os.environ.get("WHISPER_LANGUAGE") or None
+WHISPER_WORKERS = 1
+WHISPER_LOAD_TIMEOUT_SECONDS = 300
+# Batched decoding: clips are cut into overlapping 30 s windows (Whisper's
+# input size) and up to WHISPER_BATCH_SIZE windows are decoded per forward pass
+WHISPER_BATCH_SIZE = int(os.environ.get("WHISPER_BATCH_SIZE", "8"))
+WHISPER_CHUNK_SECONDS = 30
+WHISPER_CHUNK_OVERLAP_SECONDS = 2
+WHISPER_STITCH_MAX_WORDS = 12
+# Partial transcription while the reporter is speaking: incoming audio is cut
+# into segments at pauses by an energy VAD, and each closed segment is decoded
+# with the text so far as prompt. The open segment gets an interim decode at
+# most every PARTIAL_INTERIM_SECONDS so the draft keeps up with long sentences.
+PARTIAL_VAD_FRAME_SECONDS = 0.03
+PARTIAL_VAD_THRESHOLD_DBFS = -45
+PARTIAL_SEGMENT_PAUSE_SECONDS = 0.6
+PARTIAL_SEGMENT_MAX_SECONDS = 10
+PARTIAL_SEGMENT_MIN_SECONDS = 0.3
+PARTIAL_INTERIM_SECONDS = 2.0
+PARTIAL_PROMPT_WORDS = 50
+PARTIAL_REFRESH_SECONDS = 1.0
+
+# LLM priority classification via ollama
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3")
+# Longest a report submission waits for the LLM before falling back to rules
+PRIORITY_SUBMIT_BUDGET_SECONDS = float(os.environ.get("PRIORITY_BUDGET_SECONDS", "2.0"))
+PRIORITY_JOB_BUDGET_SECONDS = 60.0
+PRIORITY_LLM_TIMEOUT_SECONDS = 60.0
+PRIORITY_LLM_WORKERS = 2
+# LLM requests queued or running at once; beyond this reports skip the LLM
+PRIORITY_LLM_MAX_PENDING = 8
+PRIORITY_CACHE_MAX_ENTRIES = 2048
+# Priorities given by the reporter (the ingest API's 'device'), never re-classified
+EXPLICIT_PRIORITY_SOURCES = ('device',)
+
+# TF-IDF similar-incident index over the most recent alerts
+SIMILARITY_INDEX_SIZE = 5000
+SIMILARITY_TOP_K = 5
+SIMILARITY_SUGGESTION_MIN_SCORE = 0.5
+
+# MinHash/LSH near-duplicate detection: 32 bands of 4 rows catch pairs with a
+# Jaccard similarity of roughly 0.4 and up; DUPLICATE_THRESHOLD filters the rest
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 32
+MINHASH_PRIME = 4294967311  # smallest prime above 2^32
+MINHASH_SEED = 20240611
+DUPLICATE_THRESHOLD = 0.5
+
+# Worker processes generating WebP thumbnails and medium-size images
+IMAGE_DERIVATIVE_WORKERS = 2
+# Failed generations per image before the process stops retrying it
+IMAGE_DERIVATIVE_MAX_ATTEMPTS = 3
+
+# Live change feed on the dashboard: each session polls alert_events for rows
+# after the last sequence number it has seen
+ALERT_FEED_INTERVAL_SECONDS = float(os.environ.get("EMERGENCY_FEED_INTERVAL", "5"))
+ALERT_FEED_MAX_EVENTS = 50
+ALERT_FEED_SHOWN = 10
+
+# Page sizes offered for the alert lists
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+DEFAULT_PAGE_SIZE = 25
+
+# Alert lists go to the browser as one component that only builds the rows in
+# view; heights are in pixels
+ALERT_LIST_ROW_HEIGHT = 124
+ALERT_LIST_MAX_HEIGHT = 560
+ALERT_LIST_OVERSCAN_ROWS = 6
+ALERT_LIST_DESCRIPTION_CHARS = 240
 
 # Custom CSS for premium styling with forced dark theme
-def inject_custom_css():
-    st.markdown("""
-        <style>
+CUSTOM_CSS = """
         /* Force dark theme and override all theme variables */
         :root {
             --primary-color: #ffffff !important;
@@ -578,69 +760,629 @@ def inject_custom_css():
             background: rgba(239, 68, 68, 1) !important;
             border-color: rgba(239, 68, 68, 0.8) !important;
         }
-        </style>
-    """, unsafe_allow_html=True)
+"""
 
-# Initialize database with migration support
-def init_db():
-    conn = sqlite3.connect('emergency_alerts.db')
-    c = conn.cursor()
+def script_json(value) -> str:
+    """JSON that is safe to place inside an inline <script>"""
+    return json.dumps(value).replace("</", "<\\/")
+
+def inject_custom_css():
+    """Add the stylesheet to the page once per session.
+
+    A zero-height component inserts the style element into the app document,
+    where it outlives the component, so later reruns don't resend ~25 KB of CSS.
+    """
+    if st.session_state.get('css_injected'):
+        return
+    st.session_state.css_injected = True
+    st.components.v1.html(f"""
+        <script>
+        const doc = window.parent.document;
+        let style = doc.getElementById("emergency-alert-styles");
+        if (!style) {{
+            style = doc.createElement("style");
+            style.id = "emergency-alert-styles";
+            doc.head.appendChild(style);
+        }}
+        style.textContent = {script_json(CUSTOM_CSS)};
+        </script>
+    """, height=0)
+
+def _start_render_run(stats: dict, fragment: bool):
+    """Close the totals of the previous run and start counting a new one"""
+    if stats['deltas']:
+        kind = 'Fragment run' if stats.get('fragment') else 'Rerun'
+        logger.debug(f"{kind} sent {stats['deltas']} deltas, {stats['bytes']} bytes")
+        if not stats.get('fragment'):
+            stats['last'] = {'deltas': stats['deltas'], 'bytes': stats['bytes']}
+    stats['deltas'] = stats['bytes'] = 0
+    stats['fragment'] = fragment
+
+def track_render_stats():
+    """Count the deltas and bytes each full rerun sends to the browser.
+
+    Fragment-only runs are counted separately so they don't inflate the next
+    full rerun; the totals of the last full rerun are kept in
+    st.session_state.render_stats['last'].
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return
+    ctx = get_script_run_ctx()
+    if ctx is None or not hasattr(ctx, '_enqueue') or not hasattr(ctx, 'cursors'):
+        return
+    
+    if 'render_stats' not in st.session_state:
+        st.session_state.render_stats = {'deltas': 0, 'bytes': 0, 'fragment': False, 'last': None}
+    stats = st.session_state.render_stats
+    
+    # NOTE: this relies on private Streamlit APIs: ScriptRunContext._enqueue is
+    # wrapped to see every ForwardMsg, and ScriptRunContext.reset() assigning a
+    # fresh cursors dict marks the start of each run, fragment-only runs
+    # included. Re-check both when upgrading Streamlit.
+    if getattr(ctx, '_render_stats', None) is not stats:
+        enqueue = ctx._enqueue
+        run = ctx.cursors
+        _start_render_run(stats, bool(ctx.fragment_ids_this_run))
+        
+        def counting_enqueue(msg):
+            nonlocal run
+            if ctx.cursors is not run:
+                run = ctx.cursors
+                _start_render_run(stats, bool(ctx.fragment_ids_this_run))
+            if msg.HasField('delta'):
+                stats['deltas'] += 1
+                stats['bytes'] += msg.ByteSize()
+            enqueue(msg)
+        
+        ctx._enqueue = counting_enqueue
+        ctx._render_stats = stats
+
+# Database connection management
+class ConnectionPool:
+    """Pool of tuned SQLite connections shared by all sessions of the process.
+
+    A connection is checked out for the duration of a ``connection()`` block and
+    reused by any nested block on the same thread, so one data function never
+    holds more than one connection. Idle connections are kept for the next
+    caller instead of being closed, which means Streamlit reruns don't pay the
+    connect and pragma cost again.
+    """
+
+    def __init__(self, db_path: str, max_idle: int = DB_POOL_MAX_IDLE):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self._local = threading.local()
+
+    def _open(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly in transaction()
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        for pragma, value in DB_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection, reusing the one this thread already holds"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Run the block in a write transaction, joining an enclosing one if present"""
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+
+            # IMMEDIATE takes the write lock up front so concurrent writers wait on
+            # busy_timeout instead of failing with "database is locked" on upgrade
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close_all(self):
+        """Close every idle connection (used by tests and tooling)"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+@st.cache_resource
+def get_db_pool() -> ConnectionPool:
+    """Process-wide connection pool, surviving Streamlit reruns"""
+    return ConnectionPool(DB_PATH)
+
+# Shared read cache for alert list queries
+class AlertReadCache:
+    """LRU cache of alert query results shared by every session of the process.
+
+    Entries are tagged with the data version they were read at and only served
+    while it is unchanged. The version pairs a local generation, bumped by our
+    own writes, with PRAGMA data_version from a dedicated connection that never
+    writes, so commits from other processes (ingestion, imports) are seen too.
+    Checking it costs one pragma, no table access. Cached lists are shared and
+    must be treated as read-only.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = ALERT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._probe = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self):
+        """Invalidate everything cached so far"""
+        with self._lock:
+            self._generation += 1
+
+    def version(self) -> Tuple[int, int]:
+        with self._lock:
+            data_version = self._probe.execute('PRAGMA data_version').fetchone()[0]
+            return (self._generation, data_version)
+
+    def get_or_load(self, key: Tuple, loader):
+        version = self.version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        
+        # Load outside the lock; a write racing with this read leaves the entry
+        # tagged with the old version, so it is simply never served
+        value = loader()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+@st.cache_resource
+def get_alert_cache() -> AlertReadCache:
+    return AlertReadCache(DB_PATH)
+
+def alert_cache_stats() -> Dict:
+    """Hit/miss counters of the shared alert read cache"""
+    return get_alert_cache().stats()
+
+def priority_rank(priority: str) -> int:
+    return PRIORITY_RANKS.get(priority, UNKNOWN_PRIORITY_RANK)
+
+def incident_title(location: str) -> str:
+    """Alert title for a report, which only asks for a location"""
+    return f"{INCIDENT_TITLE_PREFIX}{location}"
+
+def incident_location(title: str) -> str:
+    """The reported location back from an alert title (titles set elsewhere are kept whole)"""
+    return title[len(INCIDENT_TITLE_PREFIX):] if title.startswith(INCIDENT_TITLE_PREFIX) else title
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+def _migrate_priority_rank(c: sqlite3.Cursor):
+    """Store the priority sort key and index the active/resolved list queries"""
+    c.execute(f'ALTER TABLE alerts ADD COLUMN priority_rank INTEGER NOT NULL DEFAULT {UNKNOWN_PRIORITY_RANK}')
+    rank_case = ' '.join(f"WHEN '{name}' THEN {rank}" for name, rank in PRIORITY_RANKS.items())
+    c.execute(f'UPDATE alerts SET priority_rank = CASE priority {rank_case} ELSE {UNKNOWN_PRIORITY_RANK} END')
     
-    # Users table
+    # Keep the rank in step if an alert is re-prioritised after insert
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS alerts_priority_rank_update
+        AFTER UPDATE OF priority ON alerts
+        BEGIN
+            UPDATE alerts
+            SET priority_rank = CASE NEW.priority {rank_case} ELSE {UNKNOWN_PRIORITY_RANK} END
+            WHERE id = NEW.id;
+        END
+    ''')
+    
+    # id breaks created_at ties, CURRENT_TIMESTAMP only has one-second resolution
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_active_department
+        ON alerts (status, department, priority_rank, created_at DESC, id DESC)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_active_all
+        ON alerts (status, priority_rank, created_at DESC, id DESC)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_resolved_all
+        ON alerts (status, resolved_at)
+    ''')
     c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
+        CREATE INDEX IF NOT EXISTS idx_alerts_resolved_department
+        ON alerts (status, department, resolved_at)
+    ''')
+
+def _migrate_alert_history(c: sqlite3.Cursor):
+    """Move alert history from the JSON file into an append-only table"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS alert_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
+            alert_id INTEGER,
+            title TEXT NOT NULL,
             department TEXT NOT NULL,
-            role TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            priority TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL
         )
     ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alert_history_department
+        ON alert_history (department, id)
+    ''')
     
-    # Alerts table - simplified version
+    legacy_history = []
+    try:
+        if os.path.exists(ALERT_HISTORY_FILE):
+            with open(ALERT_HISTORY_FILE, 'r') as f:
+                legacy_history = json.load(f)
+    except Exception as e:
+        logger.warning(f"Skipping unreadable {ALERT_HISTORY_FILE}: {e}")
+    
+    c.executemany(
+        'INSERT INTO alert_history (title, department, priority, created_at) VALUES (?, ?, ?, ?)',
+        [
+            (entry['title'], entry['department'], entry['priority'], entry['timestamp'])
+            for entry in legacy_history
+        ]
+    )
+
+def _migrate_jobs(c: sqlite3.Cursor):
+    """Durable queue for background enrichment jobs"""
     c.execute('''
-        CREATE TABLE IF NOT EXISTS alerts (
+        CREATE TABLE IF NOT EXISTS jobs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            department TEXT NOT NULL,
+            job_type TEXT NOT NULL,
+            alert_id INTEGER,
+            payload TEXT NOT NULL DEFAULT '{}',
+            idempotency_key TEXT UNIQUE,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after REAL NOT NULL,
+            locked_by TEXT,
+            locked_until REAL,
+            last_error TEXT,
+            result TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_claim
+        ON jobs (job_type, status, run_after)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_alert
+        ON jobs (alert_id)
+    ''')
+
+def _migrate_transcripts(c: sqlite3.Cursor):
+    """Whisper transcripts of audio evidence, one row per clip"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS transcripts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alert_id INTEGER NOT NULL,
+            media_path TEXT NOT NULL,
+            text TEXT NOT NULL,
+            language TEXT,
+            duration_seconds REAL,
+            real_time_factor REAL,
+            model TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (alert_id, media_path)
+        )
+    ''')
+
+def _migrate_priority_cache(c: sqlite3.Cursor):
+    """On-disk cache of LLM priority answers, keyed by normalised text hash"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS priority_cache (
+            text_hash TEXT PRIMARY KEY,
             priority TEXT NOT NULL,
-            alert_type TEXT NOT NULL,
+            model TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _migrate_duplicate_detection(c: sqlite3.Cursor):
+    """MinHash signatures, LSH buckets for active alerts, and merged reports"""
+    c.execute('ALTER TABLE alerts ADD COLUMN minhash BLOB')
+    c.execute('ALTER TABLE alerts ADD COLUMN report_count INTEGER NOT NULL DEFAULT 1')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS alert_lsh (
+            alert_id INTEGER NOT NULL,
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            PRIMARY KEY (alert_id, band)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alert_lsh_bucket
+        ON alert_lsh (band, bucket)
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS alert_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alert_id INTEGER NOT NULL,
+            description TEXT,
             media_path TEXT,
             created_by TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'active',
-            resolved_at TIMESTAMP,
-            resolved_by TEXT
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    
-    # Insert default users
-    default_users = [
-        ('fire_head', 'fire123', 'Fire', 'department_head'),
-        ('health_head', 'health123', 'Health Care', 'department_head'),
-        ('equipment_head', 'equipment123', 'Equipment Damage', 'department_head'),
-        ('missing_head', 'missing123', 'Missing Items', 'department_head'),
-        ('admin', 'admin123', 'All', 'admin'),
-        ('employee1', 'emp123', 'Fire', 'employee'),
-        ('employee2', 'emp123', 'Health Care', 'employee'),
-        ('employee3', 'emp123', 'Equipment Damage', 'employee'),
-        ('employee4', 'emp123', 'Missing Items', 'employee')
-    ]
-    
-    for username, password, department, role in default_users:
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        try:
-            c.execute(
-                'INSERT OR IGNORE INTO users (username, password_hash, department, role) VALUES (?, ?, ?, ?)',
-                (username, password_hash, department, role)
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alert_reports_alert
+        ON alert_reports (alert_id)
+    ''')
+
+def _migrate_media_store(c: sqlite3.Cursor):
+    """Content-addressed media blobs and the alerts referencing them"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS media_blobs (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS media_refs (
+            alert_id INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            PRIMARY KEY (alert_id, sha256)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_media_blobs_unreferenced
+        ON media_blobs (ref_count, created_at)
+    ''')
+
+def _migrate_alert_events(c: sqlite3.Cursor):
+    """Sequence-numbered log of created and resolved alerts, filled by triggers"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS alert_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            alert_id INTEGER NOT NULL,
+            department TEXT NOT NULL,
+            event TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alert_events_department
+        ON alert_events (department, seq)
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS alert_events_created
+        AFTER INSERT ON alerts
+        BEGIN
+            INSERT INTO alert_events (alert_id, department, event, created_at)
+            VALUES (NEW.id, NEW.department, 'created', (julianday('now') - 2440587.5) * 86400.0);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS alert_events_resolved
+        AFTER UPDATE OF status ON alerts
+        WHEN NEW.status = 'resolved' AND OLD.status != 'resolved'
+        BEGIN
+            INSERT INTO alert_events (alert_id, department, event, created_at)
+            VALUES (NEW.id, NEW.department, 'resolved', (julianday('now') - 2440587.5) * 86400.0);
+        END
+    ''')
+
+def _migrate_deferred_indexes(c: sqlite3.Cursor):
+    """Definitions of indexes dropped during a bulk import, until they're rebuilt"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS deferred_indexes (
+            name TEXT PRIMARY KEY,
+            sql TEXT NOT NULL
+        )
+    ''')
+
+def _migrate_deferred_index_heartbeat(c: sqlite3.Cursor):
+    """When each index was deferred, refreshed while its import is still running"""
+    c.execute('ALTER TABLE deferred_indexes ADD COLUMN deferred_at REAL NOT NULL DEFAULT 0')
+
+def _migrate_resolved_order(c: sqlite3.Cursor):
+    """Index resolved alerts by RESOLVED_ORDER rather than by a nullable resolved_at"""
+    c.execute('DROP INDEX IF EXISTS idx_alerts_resolved_all')
+    c.execute('DROP INDEX IF EXISTS idx_alerts_resolved_department')
+    c.execute(f'''
+        CREATE INDEX idx_alerts_resolved_all
+        ON alerts (status, {RESOLVED_ORDER}, id)
+    ''')
+    c.execute(f'''
+        CREATE INDEX idx_alerts_resolved_department
+        ON alerts (status, department, {RESOLVED_ORDER}, id)
+    ''')
+
+def _migrate_priority_source(c: sqlite3.Cursor):
+    """Who set each alert's priority, so later reviews leave explicit ones alone"""
+    c.execute('ALTER TABLE alerts ADD COLUMN priority_source TEXT')
+
+SCHEMA_MIGRATIONS = [
+    _migrate_priority_rank,
+    _migrate_alert_history,
+    _migrate_jobs,
+    _migrate_transcripts,
+    _migrate_priority_cache,
+    _migrate_duplicate_detection,
+    _migrate_media_store,
+    _migrate_alert_events,
+    _migrate_deferred_indexes,
+    _migrate_deferred_index_heartbeat,
+    _migrate_resolved_order,
+    _migrate_priority_source,
+]
+
+def migrate_db(c: sqlite3.Cursor):
+    """Apply any schema migrations newer than the database's user_version"""
+    version = c.execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        logger.info(f"Applying schema migration {number}: {migration.__name__}")
+        migration(c)
+        c.execute(f'PRAGMA user_version = {number}')
+    if version < len(SCHEMA_MIGRATIONS):
+        c.execute('ANALYZE')
+
+def defer_indexes(conn: sqlite3.Connection, tables: List[str]) -> List[str]:
+    """Drop the secondary indexes of tables, inside the caller's transaction.
+
+    Their definitions are kept in deferred_indexes, so restore_deferred_indexes
+    rebuilds them even if the bulk load that dropped them never finished. The
+    load calls touch_deferred_indexes as it goes to show it is still running.
+    """
+    placeholders = ', '.join('?' * len(tables))
+    rows = conn.execute(f'''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+    ''', tuple(tables)).fetchall()
+    now = time.time()
+    for name, sql in rows:
+        conn.execute(
+            'INSERT OR REPLACE INTO deferred_indexes (name, sql, deferred_at) VALUES (?, ?, ?)',
+            (name, sql, now)
+        )
+        conn.execute(f'DROP INDEX "{name}"')
+    return [name for name, _ in rows]
+
+def touch_deferred_indexes(conn: sqlite3.Connection, names: List[str]):
+    """Refresh the heartbeat of indexes a running bulk load has deferred"""
+    conn.executemany(
+        'UPDATE deferred_indexes SET deferred_at = ? WHERE name = ?',
+        [(time.time(), name) for name in names]
+    )
+
+def restore_deferred_indexes(conn: sqlite3.Connection, stale_after: Optional[float] = None) -> List[str]:
+    """Rebuild indexes dropped by defer_indexes, inside the caller's transaction.
+
+    With ``stale_after``, only indexes whose heartbeat is older than that many
+    seconds are rebuilt, leaving those of an import still in progress alone.
+    """
+    if stale_after is None:
+        rows = conn.execute('SELECT name, sql FROM deferred_indexes').fetchall()
+    else:
+        rows = conn.execute(
+            'SELECT name, sql FROM deferred_indexes WHERE deferred_at < ?',
+            (time.time() - stale_after,)
+        ).fetchall()
+    for name, sql in rows:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+        if not exists:
+            conn.execute(sql)
+        conn.execute('DELETE FROM deferred_indexes WHERE name = ?', (name,))
+    return [name for name, _ in rows]
+
+# Initialize database with migration support
+def init_db():
+    with get_db_pool().transaction() as conn:
+        c = conn.cursor()
+        
+        # Users table
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                department TEXT NOT NULL,
+                role TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-        except:
-            pass
-    
-    conn.commit()
-    conn.close()
+        ''')
+        
+        # Alerts table - simplified version
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                description TEXT,
+                department TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                alert_type TEXT NOT NULL,
+                media_path TEXT,
+                created_by TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'active',
+                resolved_at TIMESTAMP,
+                resolved_by TEXT
+            )
+        ''')
+        
+        # Insert default users
+        default_users = [
+            ('fire_head', 'fire123', 'Fire', 'department_head'),
+            ('health_head', 'health123', 'Health Care', 'department_head'),
+            ('equipment_head', 'equipment123', 'Equipment Damage', 'department_head'),
+            ('missing_head', 'missing123', 'Missing Items', 'department_head'),
+            ('admin', 'admin123', 'All', 'admin'),
+            ('employee1', 'emp123', 'Fire', 'employee'),
+            ('employee2', 'emp123', 'Health Care', 'employee'),
+            ('employee3', 'emp123', 'Equipment Damage', 'employee'),
+            ('employee4', 'emp123', 'Missing Items', 'employee')
+        ]
+        
+        for username, password, department, role in default_users:
+            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            try:
+                c.execute(
+                    'INSERT OR IGNORE INTO users (username, password_hash, department, role) VALUES (?, ?, ?, ?)',
+                    (username, password_hash, department, role)
+                )
+            except:
+                pass
+        
+        migrate_db(c)
+        
+        restored = restore_deferred_indexes(conn, stale_after=DEFERRED_INDEX_STALE_SECONDS)
+        if restored:
+            logger.warning(f"Rebuilt indexes left dropped by an interrupted bulk import: {', '.join(restored)}")
 
 # Hash password
 def hash_password(password: str) -> str:
@@ -648,17 +1390,16 @@ def hash_password(password: str) -> str:
 
 # Authentication functions
 def authenticate_user(username: str, password: str) -> Optional[Dict]:
-    conn = sqlite3.connect('emergency_alerts.db')
-    c = conn.cursor()
-    
-    password_hash = hash_password(password)
-    c.execute(
-        'SELECT username, department, role FROM users WHERE username = ? AND password_hash = ?',
-        (username, password_hash)
-    )
-    
-    result = c.fetchone()
-    conn.close()
+    with get_db_pool().connection() as conn:
+        c = conn.cursor()
+        
+        password_hash = hash_password(password)
+        c.execute(
+            'SELECT username, department, role FROM users WHERE username = ? AND password_hash = ?',
+            (username, password_hash)
+        )
+        
+        result = c.fetchone()
     
     if result:
         return {
@@ -669,203 +1410,2214 @@ def authenticate_user(username: str, password: str) -> Optional[Dict]:
     return None
 
 # Media handling functions
-def save_uploaded_file(uploaded_file, file_type: str) -> str:
-    """Save uploaded file and return path"""
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = uploaded_file.name.split('.')[-1]
-    filename = f"{file_type}_{timestamp}.{file_extension}"
-    filepath = os.path.join(MEDIA_DIR, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    
-    return filepath
+def media_blob_path(sha256: str, extension: str) -> str:
+    return os.path.join(MEDIA_DIR, sha256[:2], sha256[2:4], f"{sha256}.{extension}")
 
-def save_audio_file(audio_bytes: bytes) -> str:
-    """Save audio bytes to file"""
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"audio_{timestamp}.wav"
-    filepath = os.path.join(MEDIA_DIR, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(audio_bytes)
-    
-    return filepath
+def clean_extension(extension: str) -> str:
+    return ''.join(ch for ch in extension.lower() if ch.isalnum())[:8] or "bin"
 
-# Load alert history for priority determination
-def load_alert_history() -> List[Dict]:
-    """Load previous alerts to help with priority determination"""
-    try:
-        if os.path.exists(ALERT_HISTORY_FILE):
-            with open(ALERT_HISTORY_FILE, 'r') as f:
-                return json.load(f)
-    except:
-        pass
-    return []
+class MediaLimitError(ValueError):
+    """An upload is larger or longer than MEDIA_LIMITS allows"""
+
+def check_media_size(size: int, file_type: str):
+    max_bytes = MEDIA_LIMITS[file_type]['max_bytes']
+    if size > max_bytes:
+        raise MediaLimitError(
+            f"{file_type.capitalize()} files are limited to {max_bytes / (1024 * 1024):g} MB"
+        )
+
+def iter_file_chunks(fileobj, chunk_size: int = MEDIA_CHUNK_SIZE):
+    """Read a file in fixed-size chunks through one reusable buffer.
+
+    Chunks are memoryviews into that buffer and are only valid until the next
+    one is read, which is all store_media needs.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        n = fileobj.readinto(buffer)
+        if not n:
+            return
+        yield view[:n]
+
+def iter_bytes_chunks(data, chunk_size: int = MEDIA_CHUNK_SIZE):
+    """Slice an in-memory buffer into chunks without copying it"""
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+def iter_base64_chunks(encoded: str, chunk_size: int = MEDIA_CHUNK_SIZE):
+    """Decode base64 text a slice at a time instead of all at once"""
+    step = (chunk_size // 3) * 4  # whole 4-character groups
+    for start in range(0, len(encoded), step):
+        yield binascii.a2b_base64(encoded[start:start + step])
+
+def limit_media_stream(chunks, file_type: str):
+    """Pass chunks through, stopping as soon as the size limit is exceeded"""
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        check_media_size(total, file_type)
+        yield chunk
+
+def probe_audio_duration(path: str) -> Optional[float]:
+    """Duration in seconds from the container, or None if it can't be read.
 
-def save_alert_history(history: List[Dict]):
-    """Save alert history"""
+    Browser recordings often carry no duration in their header, in which case
+    the packet timestamps are scanned; nothing is decoded.
+    """
+    try:
+        import av
+    except ImportError:
+        return None
     try:
-        with open(ALERT_HISTORY_FILE, 'w') as f:
-            json.dump(history[-100:], f)
+        with av.open(path) as container:
+            if container.duration:
+                return container.duration / av.time_base
+            stream = next((s for s in container.streams if s.type == 'audio'), None)
+            if stream is None or stream.time_base is None:
+                return None
+            end = 0
+            for packet in container.demux(stream):
+                if packet.pts is not None:
+                    end = max(end, packet.pts + (packet.duration or 0))
+            return float(end * stream.time_base)
     except Exception as e:
-        logger.error(f"Error saving alert history: {e}")
+        logger.warning(f"Could not read audio duration of {path}: {e}")
+        return None
 
-# Database operations for alerts
-def create_alert(alert_data: Dict) -> bool:
+def check_audio_duration(path: str):
+    duration = probe_audio_duration(path)
+    max_seconds = MEDIA_LIMITS['audio']['max_seconds']
+    if duration is not None and duration > max_seconds:
+        raise MediaLimitError(f"Audio is limited to {max_seconds / 60:g} minutes")
+
+def store_media(chunks, extension: str, validate=None) -> str:
+    """Store a stream of bytes by content hash and return its path.
+
+    Bytes are hashed as they are written to a temp file, so nothing is held in
+    memory beyond one chunk. validate, if given, is called with the temp path
+    before the file is accepted. The temp file is renamed into place, which
+    makes the blob appear atomically; if the same content is already stored
+    the existing path is returned and the temp file discarded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    started = time.perf_counter()
+    fd, temp_path = tempfile.mkstemp(dir=MEDIA_TMP_DIR, suffix=".part")
     try:
-        conn = sqlite3.connect('emergency_alerts.db')
-        c = conn.cursor()
-        
-        c.execute('''
-            INSERT INTO alerts 
-            (title, description, department, priority, alert_type, media_path, created_by, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            alert_data['title'],
-            alert_data['description'],
-            alert_data['department'],
-            alert_data['priority'],
-            alert_data['alert_type'],
-            alert_data.get('media_path'),
-            alert_data['created_by'],
-            'active'
-        ))
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Ingested {size / 1e6:.2f} MB in {elapsed:.3f}s "
+            f"({size / max(elapsed, 1e-6) / 1e6:.1f} MB/s)"
+        )
+        if validate:
+            validate(temp_path)
+        sha256 = digest.hexdigest()
         
-        history = load_alert_history()
-        history.append({
-            'title': alert_data['title'],
-            'department': alert_data['department'],
-            'priority': alert_data['priority'],
-            'timestamp': datetime.datetime.now().isoformat()
-        })
-        save_alert_history(history)
-        
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        logger.error(f"Error creating alert: {e}")
-        return False
+        with get_db_pool().transaction() as conn:
+            row = conn.execute('SELECT path FROM media_blobs WHERE sha256 = ?', (sha256,)).fetchone()
+            if row and os.path.exists(row[0]):
+                os.remove(temp_path)
+                return row[0]
+            
+            path = media_blob_path(sha256, clean_extension(extension))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            conn.execute('''
+                INSERT OR REPLACE INTO media_blobs (sha256, path, size, ref_count, created_at)
+                VALUES (?, ?, ?, COALESCE((SELECT ref_count FROM media_blobs WHERE sha256 = ?), 0), ?)
+            ''', (sha256, path, size, sha256, time.time()))
+            return path
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def pcm_audio_path(audio_path: str) -> str:
+    """Where the 16 kHz PCM copy of a stored audio blob is kept"""
+    root, _ = os.path.splitext(audio_path)
+    return f"{root}.16k.wav"
 
-def get_alerts(department: str, role: str) -> List[Dict]:
-    conn = sqlite3.connect('emergency_alerts.db')
-    c = conn.cursor()
+def decode_audio_16k(path: str):
+    """Decode any audio file to 16 kHz mono int16 samples"""
+    import av
+    import numpy as np
     
-    if role == 'admin':
-        c.execute('''
-            SELECT * FROM alerts 
-            WHERE status = 'active' 
-            ORDER BY 
-                CASE priority 
-                    WHEN 'high' THEN 1
-                    WHEN 'medium' THEN 2
-                    WHEN 'low' THEN 3
-                END,
-                created_at DESC
-        ''')
-    else:
-        c.execute('''
-            SELECT * FROM alerts 
-            WHERE department = ? AND status = 'active' 
-            ORDER BY 
-                CASE priority 
-                    WHEN 'high' THEN 1
-                    WHEN 'medium' THEN 2
-                    WHEN 'low' THEN 3
-                END,
-                created_at DESC
-        ''', (department,))
+    pieces = []
+    with av.open(path) as container:
+        stream = next((s for s in container.streams if s.type == 'audio'), None)
+        if stream is None:
+            raise ValueError("no audio stream")
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=AUDIO_SAMPLE_RATE)
+        for frame in container.decode(stream):
+            pieces.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(frame))
+        pieces.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(None))
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int16)
+
+def frame_levels_db(frames, full_scale: float = 1.0):
+    """Mean power of each row of a (frames, samples) array, in dB below full scale"""
+    import numpy as np
     
-    alerts = []
-    for row in c.fetchall():
-        alerts.append({
-            'id': row[0],
-            'title': row[1],
-            'description': row[2],
-            'department': row[3],
-            'priority': row[4],
-            'alert_type': row[5],
-            'media_path': row[6],
-            'created_by': row[7],
-            'created_at': row[8],
-            'status': row[9],
-            'resolved_at': row[10],
-            'resolved_by': row[11]
-        })
-    
-    conn.close()
-    return alerts
-
-def get_resolved_alerts(department: str, role: str) -> List[Dict]:
-    conn = sqlite3.connect('emergency_alerts.db')
-    c = conn.cursor()
+    power = np.einsum('ij,ij->i', frames, frames, dtype=np.float64) / (frames.shape[1] * full_scale ** 2)
+    return 10 * np.log10(power + 1e-12)
+
+def speech_bounds(samples, sample_rate: int = AUDIO_SAMPLE_RATE) -> Tuple[int, int]:
+    """Sample range between the first and last frame above the silence threshold.
+
+    Frame energies are computed in one pass over a (frames, samples) view. If
+    nothing clears the threshold the whole clip is kept.
+    """
+    import numpy as np
     
-    if role == 'admin':
-        c.execute('''
-            SELECT * FROM alerts 
-            WHERE status = 'resolved' 
-            ORDER BY resolved_at DESC
-            LIMIT 50
-        ''')
-    else:
-        c.execute('''
-            SELECT * FROM alerts 
-            WHERE department = ? AND status = 'resolved' 
-            ORDER BY resolved_at DESC
-            LIMIT 50
-        ''', (department,))
+    frame_length = int(sample_rate * AUDIO_SILENCE_FRAME_SECONDS)
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return 0, len(samples)
     
-    alerts = []
-    for row in c.fetchall():
-        alerts.append({
-            'id': row[0],
-            'title': row[1],
-            'description': row[2],
-            'department': row[3],
-            'priority': row[4],
-            'alert_type': row[5],
-            'media_path': row[6],
-            'created_by': row[7],
-            'created_at': row[8],
-            'status': row[9],
-            'resolved_at': row[10],
-            'resolved_by': row[11]
-        })
-    
-    conn.close()
-    return alerts
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    level_db = frame_levels_db(frames, 32768.0)
+    threshold = max(level_db.max() - AUDIO_SILENCE_RANGE_DB, AUDIO_SILENCE_FLOOR_DBFS)
+    voiced = np.flatnonzero(level_db > threshold)
+    if len(voiced) == 0:
+        return 0, len(samples)
+    
+    pad = int(sample_rate * AUDIO_SILENCE_PAD_SECONDS)
+    return max(voiced[0] * frame_length - pad, 0), min((voiced[-1] + 1) * frame_length + pad, len(samples))
+
+def write_pcm_wav(path: str, samples):
+    # Identical uploads normalise to the same path, possibly at the same time
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with wave.open(temp_path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(AUDIO_SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+    os.replace(temp_path, path)
+
+def encode_opus(path: str, samples):
+    """Encode to Opus/OGG, byte-identical for identical samples.
+
+    The ogg muxer otherwise picks a random stream serial, which would give the
+    same recording a different content hash every time it is stored.
+    """
+    import av
+    
+    with av.open(path, 'w', format='ogg', options={'fflags': '+bitexact'}) as container:
+        stream = container.add_stream('libopus', rate=AUDIO_SAMPLE_RATE, layout='mono')
+        stream.bit_rate = AUDIO_OPUS_BITRATE
+        frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format='s16', layout='mono')
+        frame.sample_rate = AUDIO_SAMPLE_RATE
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+
+def normalize_audio(raw_path: str) -> str:
+    """Replace a freshly stored audio blob by its normalised Opus copy.
+
+    Returns the Opus blob's path, with the trimmed 16 kHz PCM written beside it
+    (see pcm_audio_path). The raw blob is dropped unless something already
+    refers to it. If the file can't be decoded or re-encoded the raw blob is
+    kept as is. Encoding is deterministic, so re-uploading the same file maps
+    to the same Opus blob and PCM copy.
+    """
+    try:
+        import av  # noqa: F401
+        import numpy as np  # noqa: F401
+    except ImportError:
+        return raw_path
+    
+    started = time.perf_counter()
+    raw_size = os.path.getsize(raw_path)
+    try:
+        samples = decode_audio_16k(raw_path)
+    except Exception as e:
+        logger.warning(f"Keeping {raw_path} unnormalised: {e}")
+        return raw_path
+    if len(samples) == 0:
+        return raw_path
+    start, end = speech_bounds(samples)
+    samples = samples[start:end]
+    
+    fd, temp_path = tempfile.mkstemp(dir=MEDIA_TMP_DIR, suffix=".ogg")
+    os.close(fd)
+    try:
+        encode_opus(temp_path, samples)
+        with open(temp_path, 'rb') as f:
+            opus_path = store_media(iter_file_chunks(f), "ogg")
+    except Exception as e:
+        logger.warning(f"Keeping {raw_path} unnormalised: {e}")
+        return raw_path
+    finally:
+        os.remove(temp_path)
+    try:
+        if not os.path.exists(pcm_audio_path(opus_path)):
+            write_pcm_wav(pcm_audio_path(opus_path), samples)
+    except OSError as e:
+        # Transcription decodes the Opus blob instead
+        logger.warning(f"Could not write the PCM copy of {opus_path}: {e}")
+    
+    discard_unreferenced_media(raw_path)
+    logger.info(
+        f"Normalised {os.path.basename(raw_path)} in {time.perf_counter() - started:.2f}s: "
+        f"{raw_size} -> {os.path.getsize(opus_path)} bytes, {len(samples) / AUDIO_SAMPLE_RATE:.1f}s kept"
+    )
+    return opus_path
+
+class LiveAudioRecorder:
+    """Encodes WebRTC audio frames to an Opus file while the reporter speaks.
+
+    Frames are downmixed and encoded straight into a temp file, so memory stays
+    flat however long the recording runs and nothing has to be posted from the
+    browser afterwards. add_frame runs on streamlit-webrtc's worker thread and
+    the other methods on the script thread, hence the lock. Encoding stops once
+    the audio duration limit is reached. If transcriber_factory is set, each
+    recording also gets a PartialTranscriber fed with 16 kHz audio.
+    """
+
+    def __init__(self, transcriber_factory=None):
+        self._lock = threading.Lock()
+        self._container = None
+        self._stream = None
+        self._resampler = None
+        self._pcm_resampler = None
+        self._temp_path = None
+        self.transcriber_factory = transcriber_factory
+        self.transcriber = None
+        self._result = None
+        # True from a recording's first frame until finish(); limit_reached and
+        # error describe that recording and are reset when the next one starts
+        self._recording = False
+        self.seconds = 0.0
+        self.limit_reached = False
+        self.error = None
+
+    def _open(self):
+        import av
+        
+        fd, self._temp_path = tempfile.mkstemp(dir=MEDIA_TMP_DIR, suffix=".live.ogg")
+        os.close(fd)
+        # flush_packets writes each Ogg page out as it fills instead of buffering in libav
+        self._container = av.open(self._temp_path, 'w', format='ogg', options={'flush_packets': '1'})
+        self._stream = self._container.add_stream('libopus', rate=LIVE_AUDIO_SAMPLE_RATE, layout='mono')
+        self._stream.bit_rate = LIVE_AUDIO_BITRATE
+        self._resampler = av.AudioResampler(format='s16', layout='mono', rate=LIVE_AUDIO_SAMPLE_RATE)
+        if self.transcriber_factory:
+            self._pcm_resampler = av.AudioResampler(format='flt', layout='mono', rate=AUDIO_SAMPLE_RATE)
+            self.transcriber = self.transcriber_factory()
+
+    def add_frame(self, frame):
+        """audio_frame_callback for webrtc_streamer; passes the frame through"""
+        with self._lock:
+            if not self._recording:
+                self._recording = True
+                self.seconds = 0.0
+                self.limit_reached = False
+                self.error = None
+            if self.limit_reached or self.error:
+                return frame
+            try:
+                if self._container is None:
+                    self._open()
+                for resampled in self._resampler.resample(frame):
+                    for packet in self._stream.encode(resampled):
+                        self._container.mux(packet)
+                    self.seconds += resampled.samples / LIVE_AUDIO_SAMPLE_RATE
+                if self.transcriber:
+                    for pcm in self._pcm_resampler.resample(frame):
+                        self.transcriber.feed(pcm.to_ndarray().reshape(-1))
+            except Exception as e:
+                logger.error(f"Live audio encoding failed: {e}")
+                self.error = str(e)
+            if self.seconds >= MEDIA_LIMITS['audio']['max_seconds']:
+                self.limit_reached = True
+        return frame
+
+    def finish(self):
+        """Close the current recording and add it to the media store.
+
+        Called when the audio track ends (also on a dropped connection) and again
+        from the script; only the first call does anything.
+        """
+        with self._lock:
+            self._recording = False
+            if self._container is None:
+                return
+            container, temp_path = self._container, self._temp_path
+            self._container = self._stream = self._resampler = self._pcm_resampler = self._temp_path = None
+            if self.transcriber:
+                self.transcriber.close()
+            try:
+                for packet in container.streams.audio[0].encode(None):
+                    container.mux(packet)
+            finally:
+                container.close()
+            
+            try:
+                with open(temp_path, 'rb') as f:
+                    self._result = normalize_audio(store_media(iter_file_chunks(f), "ogg"))
+            finally:
+                os.remove(temp_path)
+            logger.info(f"Live recording of {self.seconds:.1f}s stored as {self._result}")
+
+    def take_recording(self) -> Optional[str]:
+        """Path of the last finished recording, handed out once.
+
+        The recording's transcriber is let go along with it, so the next
+        recording starts from a fresh one.
+        """
+        self.finish()
+        with self._lock:
+            result, self._result = self._result, None
+            self.transcriber = None
+            return result
+
+def add_media_refs(conn: sqlite3.Connection, alert_id: int, media_path: Optional[str]):
+    """Count an alert's references to stored blobs, inside the caller's transaction"""
+    for _, path in parse_media_paths(media_path):
+        row = conn.execute('SELECT sha256 FROM media_blobs WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            continue  # legacy file outside the blob store
+        c = conn.execute('INSERT OR IGNORE INTO media_refs (alert_id, sha256) VALUES (?, ?)', (alert_id, row[0]))
+        if c.rowcount:
+            conn.execute('UPDATE media_blobs SET ref_count = ref_count + 1 WHERE sha256 = ?', (row[0],))
+
+def collect_unreferenced_media(min_age_seconds: float = MEDIA_GC_MIN_AGE_SECONDS) -> int:
+    """Delete blobs no alert refers to, with their derivatives; returns how many"""
+    with get_db_pool().connection() as conn:
+        rows = conn.execute(
+            'SELECT sha256, path FROM media_blobs WHERE ref_count = 0 AND created_at < ?',
+            (time.time() - min_age_seconds,)
+        ).fetchall()
+    
+    removed = sum(remove_unreferenced_blob(sha256, path) for sha256, path in rows)
+    if removed:
+        logger.info(f"Removed {removed} unreferenced media blobs")
+    return removed
+
+def remove_unreferenced_blob(sha256: str, path: str) -> bool:
+    with get_db_pool().transaction() as conn:
+        # Re-check inside the write lock in case an alert just claimed it
+        c = conn.execute('DELETE FROM media_blobs WHERE sha256 = ? AND ref_count = 0', (sha256,))
+        if not c.rowcount:
+            return False
+    for stale_path in (path, derivative_path(path, 'thumb'), derivative_path(path, 'medium'), pcm_audio_path(path)):
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+    return True
+
+def discard_unreferenced_media(path: str) -> bool:
+    """Remove a blob straight away if no alert refers to it"""
+    with get_db_pool().connection() as conn:
+        row = conn.execute('SELECT sha256 FROM media_blobs WHERE path = ?', (path,)).fetchone()
+    return bool(row) and remove_unreferenced_blob(row[0], path)
+
+@st.cache_resource
+def collect_unreferenced_media_at_startup() -> int:
+    return collect_unreferenced_media()
+
+def save_media(chunks, extension: str, file_type: str, size: Optional[int] = None) -> str:
+    """Store an image or audio stream with the upload limits and post-processing.
+
+    size, when known up front, rejects an oversized file before anything is
+    read. Raises MediaLimitError if the file is too big or too long.
+    """
+    if size is not None:
+        check_media_size(size, file_type)
+    filepath = store_media(
+        limit_media_stream(chunks, file_type),
+        extension,
+        validate=check_audio_duration if file_type == "audio" else None
+    )
+    
+    if file_type == "audio":
+        filepath = normalize_audio(filepath)
+    if file_type == "image" and not os.path.exists(derivative_path(filepath, 'thumb')):
+        get_image_derivatives().schedule(filepath)
+    
+    return filepath
+
+def save_uploaded_file(uploaded_file, file_type: str) -> str:
+    """Save uploaded file and return path; raises MediaLimitError if it's too big"""
+    uploaded_file.seek(0)
+    return save_media(
+        iter_file_chunks(uploaded_file),
+        uploaded_file.name.split('.')[-1],
+        file_type,
+        getattr(uploaded_file, 'size', None)
+    )
+
+def save_audio_file(audio_bytes: bytes) -> str:
+    """Save audio bytes to file"""
+    return save_media(iter_bytes_chunks(audio_bytes), "wav", "audio", len(audio_bytes))
+
+def save_recorded_audio(data_url: str) -> str:
+    """Save a recording posted as a base64 data URL, decoding it chunk by chunk"""
+    _, _, encoded = data_url.partition(',')
+    padding = len(encoded) - len(encoded.rstrip('='))
+    check_media_size(len(encoded) // 4 * 3 - padding, "audio")
+    return normalize_audio(store_media(
+        limit_media_stream(iter_base64_chunks(encoded), "audio"),
+        "wav",
+        validate=check_audio_duration
+    ))
+
+class ImageDerivativePipeline:
+    """Generates image derivatives in a process pool, off the request path.
+
+    Spawned rather than forked workers, since the server process is
+    multi-threaded. Until a derivative exists the cards say so and fall back
+    to loading the original on request. An image that keeps failing (say, a
+    file Pillow can't decode) is given up on after IMAGE_DERIVATIVE_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, workers: int = IMAGE_DERIVATIVE_WORKERS):
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self._pending = set()
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, image_path: str) -> bool:
+        """Queue generation unless it is already queued; False once given up on"""
+        with self._lock:
+            if self._failures.get(image_path, 0) >= IMAGE_DERIVATIVE_MAX_ATTEMPTS:
+                return False
+            if image_path in self._pending:
+                return True
+            self._pending.add(image_path)
+        future = self._pool.submit(generate_image_derivatives, image_path)
+        future.add_done_callback(lambda done: self._finished(image_path, done))
+        return True
+
+    def _finished(self, image_path: str, future):
+        error = future.exception()
+        with self._lock:
+            self._pending.discard(image_path)
+            if error is not None:
+                self._failures[image_path] = self._failures.get(image_path, 0) + 1
+        if error is not None:
+            logger.error(f"Error generating derivatives for {image_path}: {error}")
+
+@st.cache_resource
+def get_image_derivatives() -> ImageDerivativePipeline:
+    return ImageDerivativePipeline()
+
+# Alert history for priority determination
+def append_alert_history(conn: sqlite3.Connection, alert_id: int, alert_data: Dict):
+    """Record an alert in the history, inside the caller's transaction"""
+    conn.execute(
+        'INSERT INTO alert_history (alert_id, title, department, priority, created_at) VALUES (?, ?, ?, ?, ?)',
+        (
+            alert_id,
+            alert_data['title'],
+            alert_data['department'],
+            alert_data['priority'],
+            datetime.datetime.now().isoformat()
+        )
+    )
+
+def load_alert_history(limit: int = ALERT_HISTORY_TAIL, department: Optional[str] = None) -> List[Dict]:
+    """Load the most recent alerts to help with priority determination, oldest first"""
+    with get_db_pool().connection() as conn:
+        if department is None:
+            rows = conn.execute('''
+                SELECT alert_id, title, department, priority, created_at FROM alert_history
+                ORDER BY id DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        else:
+            rows = conn.execute('''
+                SELECT alert_id, title, department, priority, created_at FROM alert_history
+                WHERE department = ?
+                ORDER BY id DESC LIMIT ?
+            ''', (department, limit)).fetchall()
+    
+    return [
+        {
+            'alert_id': row[0],
+            'title': row[1],
+            'department': row[2],
+            'priority': row[3],
+            'timestamp': row[4]
+        }
+        for row in reversed(rows)
+    ]
+
+# Database operations for alerts
+def insert_alert(conn: sqlite3.Connection, alert_data: Dict) -> Tuple[int, List[str]]:
+    """Insert an alert inside the caller's transaction; returns its id and queued job types"""
+    c = conn.execute('''
+        INSERT INTO alerts 
+        (title, description, department, priority, priority_rank, priority_source, alert_type, media_path, created_by, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        alert_data['title'],
+        alert_data['description'],
+        alert_data['department'],
+        alert_data['priority'],
+        priority_rank(alert_data['priority']),
+        alert_data.get('priority_source'),
+        alert_data['alert_type'],
+        alert_data.get('media_path'),
+        alert_data['created_by'],
+        'active'
+    ))
+    
+    alert_id = c.lastrowid
+    signature = alert_data.get('minhash') or compute_minhash(alert_data['title'], alert_data['description'])
+    index_alert_signature(conn, alert_id, signature)
+    add_media_refs(conn, alert_id, alert_data.get('media_path'))
+    append_alert_history(conn, alert_id, alert_data)
+    # Heavy post-processing runs on the job workers, not in this request
+    return alert_id, enqueue_enrichment(conn, alert_id, alert_data)
+
+def create_alerts(batch: List[Dict]) -> List[int]:
+    """Insert several alerts in one transaction and return their ids, in order.
+
+    All or nothing: an exception means the whole batch was rolled back. Once
+    the transaction has committed nothing is raised, so callers can safely
+    retry on error without creating duplicates.
+    """
+    alert_ids = []
+    queued_jobs = set()
+    with get_db_pool().transaction() as conn:
+        for alert_data in batch:
+            alert_id, job_types = insert_alert(conn, alert_data)
+            alert_ids.append(alert_id)
+            queued_jobs.update(job_types)
+    
+    get_alert_cache().bump()
+    # In-process conveniences only: the index catches up from the table and
+    # the workers poll, so a failure here just delays them
+    try:
+        similarity_index = get_similarity_index()
+        for alert_id, alert_data in zip(alert_ids, batch):
+            similarity_index.add_alert(alert_id, alert_data)
+    except Exception as e:
+        logger.error(f"Error adding alerts {alert_ids} to the similarity index: {e}")
+    try:
+        # Wake the workers only once the jobs are committed and visible
+        workers = get_job_workers()
+        for job_type in queued_jobs:
+            workers.notify(job_type)
+    except Exception as e:
+        logger.error(f"Error waking job workers for alerts {alert_ids}: {e}")
+    return alert_ids
+
+def create_alert(alert_data: Dict) -> bool:
+    try:
+        create_alerts([alert_data])
+        return True
+    except Exception as e:
+        logger.error(f"Error creating alert: {e}")
+        return False
+
+def alert_from_row(row: Tuple) -> Dict:
+    """Map a row selected with ALERT_SELECT to an alert dict"""
+    return dict(zip(ALERT_COLUMNS, row))
+
+# Keyset pagination
+def active_alert_cursor(alert: Dict) -> Tuple:
+    """Keyset cursor for paging get_alerts after this alert"""
+    return (alert['priority_rank'], alert['created_at'], alert['id'])
+
+def resolved_alert_cursor(alert: Dict) -> Tuple:
+    """Keyset cursor for paging get_resolved_alerts after this alert (see RESOLVED_ORDER)"""
+    return (alert['resolved_at'] or alert['created_at'], alert['id'])
+
+def _department_scope(department: str, role: str, column: str = "department") -> Tuple[str, Tuple]:
+    """WHERE fragment limiting non-admin users to their own department"""
+    if role == 'admin':
+        return "", ()
+    return f"{column} = ? AND ", (department,)
+
+def get_alerts(department: str, role: str, limit: Optional[int] = None,
+               after: Optional[Tuple] = None) -> List[Dict]:
+    """Active alerts in queue order (priority, then newest first).
+
+    With ``limit`` and ``after`` (an active_alert_cursor) this returns one
+    keyset page; every query is an index range seek, so the cost of a page
+    does not depend on how deep into the queue it is. Pages are served from
+    the shared read cache while the data is unchanged.
+    """
+    scope_department = '*' if role == 'admin' else department
+    return get_alert_cache().get_or_load(
+        ('active', scope_department, role, limit, after),
+        lambda: query_active_alerts(department, role, limit, after)
+    )
+
+def get_resolved_alerts(department: str, role: str, limit: Optional[int] = 50,
+                        after: Optional[Tuple] = None, filter_department: Optional[str] = None,
+                        priority: Optional[str] = None, oldest_first: bool = False) -> List[Dict]:
+    """Resolved alerts, most recently resolved first, paged by resolved_alert_cursor.
+
+    ``filter_department`` and ``priority`` narrow the list further and
+    ``oldest_first`` reverses it; pass the same values for every page.
+    """
+    scope_department = '*' if role == 'admin' else department
+    return get_alert_cache().get_or_load(
+        ('resolved', scope_department, role, limit, after, filter_department, priority, oldest_first),
+        lambda: query_resolved_alerts(department, role, limit, after, filter_department, priority, oldest_first)
+    )
+
+def get_alert_counts(department: str, role: str) -> Dict[str, int]:
+    """Active alert totals for the metric cards: {'total', 'high', 'medium', 'low'}"""
+    scope_department = '*' if role == 'admin' else department
+    return get_alert_cache().get_or_load(
+        ('counts', scope_department, role),
+        lambda: query_alert_counts(department, role)
+    )
+
+def query_alert_counts(department: str, role: str) -> Dict[str, int]:
+    """Uncached query behind get_alert_counts"""
+    scope, params = _department_scope(department, role)
+    
+    # Grouping on priority_rank is answered from the active-queue index alone
+    with get_db_pool().connection() as conn:
+        rows = conn.execute(f'''
+            SELECT priority_rank, COUNT(*) FROM alerts
+            WHERE {scope}status = 'active'
+            GROUP BY priority_rank
+        ''', params).fetchall()
+    
+    counts_by_rank = dict(rows)
+    counts = {name: counts_by_rank.get(rank, 0) for name, rank in PRIORITY_RANKS.items()}
+    counts['total'] = sum(counts_by_rank.values())
+    return counts
+
+def query_active_alerts(department: str, role: str, limit: Optional[int] = None,
+                        after: Optional[Tuple] = None) -> List[Dict]:
+    """Uncached query behind get_alerts"""
+    scope, params = _department_scope(department, role)
+    # SQLite treats a negative LIMIT as no limit
+    limit = -1 if limit is None else limit
+    
+    with get_db_pool().connection() as conn:
+        c = conn.cursor()
+        
+        # Both queries walk an index in order (no temp B-tree for the sort)
+        if after is None:
+            c.execute(f'''
+                SELECT {ALERT_SELECT} FROM alerts
+                WHERE {scope}status = 'active' 
+                ORDER BY priority_rank, created_at DESC, id DESC
+                LIMIT ?
+            ''', params + (limit,))
+            return [alert_from_row(row) for row in c.fetchall()]
+        
+        # The sort mixes ASC and DESC, so a single row-value comparison can't
+        # express "after the cursor". Finish the cursor's priority band first,
+        # then continue with the lower priorities.
+        rank, created_at, alert_id = after
+        c.execute(f'''
+            SELECT {ALERT_SELECT} FROM alerts
+            WHERE {scope}status = 'active' AND priority_rank = ?
+                AND (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', params + (rank, created_at, alert_id, limit))
+        alerts = [alert_from_row(row) for row in c.fetchall()]
+        
+        if limit < 0 or len(alerts) < limit:
+            c.execute(f'''
+                SELECT {ALERT_SELECT} FROM alerts
+                WHERE {scope}status = 'active' AND priority_rank > ?
+                ORDER BY priority_rank, created_at DESC, id DESC
+                LIMIT ?
+            ''', params + (rank, limit - len(alerts) if limit >= 0 else -1))
+            alerts.extend(alert_from_row(row) for row in c.fetchall())
+        
+        return alerts
+
+def query_resolved_alerts(department: str, role: str, limit: Optional[int] = 50,
+                          after: Optional[Tuple] = None, filter_department: Optional[str] = None,
+                          priority: Optional[str] = None, oldest_first: bool = False) -> List[Dict]:
+    """Uncached query behind get_resolved_alerts"""
+    scope, params = _department_scope(department, role)
+    if filter_department:
+        scope += "department = ? AND "
+        params += (filter_department,)
+    # Not in the index; with three priorities the walk reads a few times the page
+    if priority:
+        scope += "priority = ? AND "
+        params += (priority,)
+    limit = -1 if limit is None else limit
+    direction, comparison = ('ASC', '>') if oldest_first else ('DESC', '<')
+    
+    with get_db_pool().connection() as conn:
+        c = conn.cursor()
+        
+        if after is None:
+            c.execute(f'''
+                SELECT {ALERT_SELECT} FROM alerts
+                WHERE {scope}status = 'resolved' 
+                ORDER BY {RESOLVED_ORDER} {direction}, id {direction}
+                LIMIT ?
+            ''', params + (limit,))
+        else:
+            # SQLite won't seek an expression index on a row value alone; the
+            # plain bound on RESOLVED_ORDER gives it the range to seek to
+            c.execute(f'''
+                SELECT {ALERT_SELECT} FROM alerts
+                WHERE {scope}status = 'resolved' AND {RESOLVED_ORDER} {comparison}= ?
+                    AND ({RESOLVED_ORDER}, id) {comparison} (?, ?)
+                ORDER BY {RESOLVED_ORDER} {direction}, id {direction}
+                LIMIT ?
+            ''', params + (after[0],) + tuple(after) + (limit,))
+        
+        return [alert_from_row(row) for row in c.fetchall()]
+
+def resolve_alert(alert_id: int, resolved_by: str) -> bool:
+    try:
+        with get_db_pool().transaction() as conn:
+            c = conn.cursor()
+            
+            c.execute('''
+                UPDATE alerts 
+                SET status = 'resolved', resolved_at = CURRENT_TIMESTAMP, resolved_by = ?
+                WHERE id = ?
+            ''', (resolved_by, alert_id))
+            # Resolved alerts no longer absorb duplicate reports
+            c.execute('DELETE FROM alert_lsh WHERE alert_id = ?', (alert_id,))
+        
+        get_alert_cache().bump()
+        return True
+    except Exception as e:
+        logger.error(f"Error resolving alert: {e}")
+        return False
+
+def latest_alert_event_seq() -> int:
+    with get_db_pool().connection() as conn:
+        return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM alert_events').fetchone()[0]
+
+def get_alert_events(department: str, role: str, after_seq: int,
+                     limit: int = ALERT_FEED_MAX_EVENTS) -> List[Dict]:
+    """Alerts created or resolved after after_seq, oldest first.
+
+    A single range seek on the events' sequence number (per department for
+    non-admins), joined to the alert rows, so a poll that finds nothing new
+    costs one index probe. Not cached: polling is what notices the change.
+    """
+    scope, params = _department_scope(department, role, "e.department")
+    alert_columns = ', '.join(f'a.{column}' for column in ALERT_COLUMNS)
+    with get_db_pool().connection() as conn:
+        rows = conn.execute(f'''
+            SELECT e.seq, e.event, {alert_columns}
+            FROM alert_events e JOIN alerts a ON a.id = e.alert_id
+            WHERE {scope}e.seq > ?
+            ORDER BY e.seq
+            LIMIT ?
+        ''', params + (after_seq, limit)).fetchall()
+    return [{'seq': row[0], 'event': row[1], 'alert': alert_from_row(row[2:])} for row in rows]
+
+# Background enrichment jobs
+#
+# Jobs are rows in the durable jobs table, so queued work survives restarts.
+# Each registered job type gets its own worker threads (its concurrency
+# limit), started once per server process. A claimed job holds a lease; if the
+# process dies mid-job the lease expires and another worker picks it up.
+JOB_HANDLERS: Dict[str, Dict] = {}
+
+def register_job_handler(job_type: str, handler, concurrency: int = 1,
+                         max_attempts: int = JOB_MAX_ATTEMPTS, applies_to=None,
+                         batch_size: int = 1):
+    """Register an enrichment job type.
+
+    ``handler(job)`` receives the job dict (with its decoded payload) and may
+    return a JSON-serialisable result; raising marks the attempt as failed.
+    With ``batch_size`` > 1 a worker claims up to that many queued jobs at once
+    and calls ``handler(jobs)``, which returns {job_id: result or exception}.
+    ``applies_to(alert_data)`` decides whether create_alert enqueues this type
+    for a new alert; without it the type is only run when enqueued explicitly.
+    """
+    JOB_HANDLERS[job_type] = {
+        'handler': handler,
+        'concurrency': concurrency,
+        'max_attempts': max_attempts,
+        'applies_to': applies_to,
+        'batch_size': batch_size
+    }
+
+def job_retry_delay(attempts: int) -> float:
+    """Exponential backoff before the next attempt"""
+    return min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+
+def enqueue_job(conn: sqlite3.Connection, job_type: str, alert_id: Optional[int] = None,
+                payload: Optional[Dict] = None, idempotency_key: Optional[str] = None,
+                max_attempts: Optional[int] = None) -> Optional[int]:
+    """Queue a job inside the caller's transaction.
+
+    A job whose idempotency key already exists is not queued again; the id of
+    the existing job is returned instead.
+    """
+    if max_attempts is None:
+        max_attempts = JOB_HANDLERS.get(job_type, {}).get('max_attempts', JOB_MAX_ATTEMPTS)
+    
+    now = time.time()
+    c = conn.execute('''
+        INSERT OR IGNORE INTO jobs
+        (job_type, alert_id, payload, idempotency_key, status, max_attempts, run_after, created_at, updated_at)
+        VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+    ''', (job_type, alert_id, json.dumps(payload or {}), idempotency_key, max_attempts, now, now, now))
+    
+    if c.rowcount:
+        return c.lastrowid
+    row = conn.execute('SELECT id FROM jobs WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+    return row[0] if row else None
+
+def enqueue_enrichment(conn: sqlite3.Connection, alert_id: int, alert_data: Dict) -> List[str]:
+    """Queue every registered enrichment that applies to a new alert; returns the job types"""
+    queued = []
+    for job_type, spec in JOB_HANDLERS.items():
+        applies_to = spec['applies_to']
+        if applies_to is not None and applies_to(alert_data):
+            enqueue_job(conn, job_type, alert_id, idempotency_key=f"{job_type}:{alert_id}")
+            queued.append(job_type)
+    return queued
+
+def job_from_row(row: Tuple) -> Dict:
+    return {
+        'id': row[0],
+        'job_type': row[1],
+        'alert_id': row[2],
+        'payload': json.loads(row[3]) if row[3] else {},
+        'attempts': row[4],
+        'max_attempts': row[5]
+    }
+
+def claim_jobs(job_type: str, worker_id: str, limit: int = 1) -> List[Dict]:
+    """Lease up to ``limit`` runnable jobs of a type.
+
+    Attempts are counted when a job is claimed, so a job whose lease expired
+    because its worker died counts that attempt too; once it has used all of
+    them it is failed here instead of being leased again.
+    """
+    now = time.time()
+    with get_db_pool().transaction() as conn:
+        conn.execute('''
+            UPDATE jobs
+            SET status = 'failed', last_error = 'Lease expired on the final attempt',
+                locked_by = NULL, locked_until = NULL, updated_at = ?
+            WHERE job_type = ? AND status = 'running' AND locked_until < ? AND attempts >= max_attempts
+        ''', (now, job_type, now))
+        
+        rows = conn.execute('''
+            SELECT id, job_type, alert_id, payload, attempts, max_attempts FROM jobs
+            WHERE job_type = ? AND (
+                (status = 'queued' AND run_after <= ?)
+                OR (status = 'running' AND locked_until < ?)
+            )
+            ORDER BY run_after
+            LIMIT ?
+        ''', (job_type, now, now, limit)).fetchall()
+        
+        conn.executemany('''
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ?, updated_at = ?
+            WHERE id = ?
+        ''', [(worker_id, now + JOB_LEASE_SECONDS, now, row[0]) for row in rows])
+    
+    jobs = [job_from_row(row) for row in rows]
+    for job in jobs:
+        job['attempts'] += 1
+    return jobs
+
+def complete_job(job: Dict, result=None):
+    with get_db_pool().transaction() as conn:
+        conn.execute('''
+            UPDATE jobs
+            SET status = 'succeeded', result = ?, last_error = NULL, locked_by = NULL, locked_until = NULL, updated_at = ?
+            WHERE id = ?
+        ''', (json.dumps(result) if result is not None else None, time.time(), job['id']))
+
+def fail_job(job: Dict, error: str):
+    """Record a failed attempt, scheduling a retry with backoff if any are left"""
+    now = time.time()
+    retry = job['attempts'] < job['max_attempts']
+    with get_db_pool().transaction() as conn:
+        conn.execute('''
+            UPDATE jobs
+            SET status = ?, run_after = ?, last_error = ?, locked_by = NULL, locked_until = NULL, updated_at = ?
+            WHERE id = ?
+        ''', (
+            'queued' if retry else 'failed',
+            now + job_retry_delay(job['attempts']) if retry else now,
+            error[:2000],
+            now,
+            job['id']
+        ))
+
+class JobWorkers:
+    """Worker threads for every registered job type, one pool per server process"""
+
+    def __init__(self, handlers: Dict[str, Dict]):
+        self.handlers = dict(handlers)
+        self._wakeups = {job_type: threading.Event() for job_type in self.handlers}
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for job_type, spec in self.handlers.items():
+            for n in range(spec['concurrency']):
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(job_type, f"{os.getpid()}-{job_type}-{n}"),
+                    name=f"job-worker-{job_type}-{n}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Started {len(self._threads)} job workers for {sorted(self.handlers)}")
+
+    def stop(self):
+        self._stop.set()
+        for wakeup in self._wakeups.values():
+            wakeup.set()
+
+    def notify(self, job_type: str):
+        wakeup = self._wakeups.get(job_type)
+        if wakeup is not None:
+            wakeup.set()
+
+    def _run(self, job_type: str, worker_id: str):
+        handler = self.handlers[job_type]['handler']
+        batch_size = self.handlers[job_type]['batch_size']
+        wakeup = self._wakeups[job_type]
+        
+        while not self._stop.is_set():
+            try:
+                jobs = claim_jobs(job_type, worker_id, batch_size)
+            except Exception as e:
+                logger.error(f"Error claiming {job_type} job: {e}")
+                jobs = []
+            
+            if not jobs:
+                wakeup.wait(JOB_POLL_SECONDS)
+                wakeup.clear()
+                continue
+            
+            started = time.perf_counter()
+            try:
+                if batch_size > 1:
+                    outcomes = handler(jobs)
+                else:
+                    outcomes = {jobs[0]['id']: handler(jobs[0])}
+            except Exception as e:
+                outcomes = {job['id']: e for job in jobs}
+            elapsed = time.perf_counter() - started
+            
+            for job in jobs:
+                outcome = outcomes.get(job['id'])
+                # A failed status write must not kill the worker thread; the
+                # job keeps its lease and is retried once the lease expires
+                try:
+                    if isinstance(outcome, Exception):
+                        logger.warning(f"Job {job['id']} ({job_type}) attempt {job['attempts']} failed: {outcome}")
+                        fail_job(job, f"{type(outcome).__name__}: {outcome}")
+                    else:
+                        complete_job(job, outcome)
+                except Exception as e:
+                    logger.error(f"Error recording the outcome of job {job['id']} ({job_type}): {e}")
+            logger.info(f"{len(jobs)} {job_type} job(s) handled in {elapsed:.2f}s")
+
+@st.cache_resource
+def get_job_workers() -> JobWorkers:
+    """Start the job workers once per server process"""
+    workers = JobWorkers(JOB_HANDLERS)
+    if JOB_WORKERS_ENABLED:
+        workers.start()
+    return workers
+
+def get_enrichment_status(alert_ids: List[int]) -> Dict[int, List[Dict]]:
+    """Job states for a page of alerts, keyed by alert id"""
+    if not alert_ids:
+        return {}
+    
+    def load():
+        placeholders = ','.join('?' * len(alert_ids))
+        with get_db_pool().connection() as conn:
+            rows = conn.execute(f'''
+                SELECT alert_id, job_type, status, attempts, last_error FROM jobs
+                WHERE alert_id IN ({placeholders})
+                ORDER BY id
+            ''', tuple(alert_ids)).fetchall()
+        
+        status = {}
+        for alert_id, job_type, job_status, attempts, last_error in rows:
+            status.setdefault(alert_id, []).append({
+                'job_type': job_type,
+                'status': job_status,
+                'attempts': attempts,
+                'last_error': last_error
+            })
+        return status
+    
+    return get_alert_cache().get_or_load(('jobs', tuple(alert_ids)), load)
+
+# Audio transcription
+#
+# One Whisper model per server process, loaded and warmed up on a background
+# thread at startup so neither the first report nor the first page render pays
+# for it. whisper and torch are imported lazily; without them transcription
+# jobs fail with a clear error and everything else keeps working.
+class TranscriptionService:
+    def __init__(self, model_size: str = WHISPER_MODEL_SIZE, quantize: bool = WHISPER_QUANTIZE):
+        self.model_size = model_size
+        self.quantize = quantize
+        self.model = None
+        self.error = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._load, name="whisper-loader", daemon=True).start()
+
+    def _load(self):
+        try:
+            import numpy as np
+            import torch
+            import whisper
+            
+            started = time.perf_counter()
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            model = whisper.load_model(self.model_size, device=device)
+            quantized = 0
+            if device == "cpu" and self.quantize:
+                # int8 weights for the Linear layers, which dominate CPU decode time.
+                # Whisper's layers are a Linear subclass (it only adds a dtype cast
+                # for fp16), which quantize_dynamic matches by exact type and skips,
+                # so make them plain Linear layers first.
+                for module in model.modules():
+                    if isinstance(module, whisper.model.Linear):
+                        module.__class__ = torch.nn.Linear
+                linear = sum(isinstance(module, torch.nn.Linear) for module in model.modules())
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                quantized = linear - sum(type(module) is torch.nn.Linear for module in model.modules())
+            self.device = device
+            self.n_mels = model.dims.n_mels
+            
+            # Warm-up pass so the first real clip doesn't pay for lazy initialisation
+            model.transcribe(np.zeros(whisper.audio.SAMPLE_RATE, dtype=np.float32), fp16=False)
+            
+            self.model = model
+            logger.info(
+                f"Whisper '{self.model_size}' ready on {device}"
+                f"{f' (int8 dynamic quantization of {quantized} Linear layers)' if quantized else ''}"
+                f" in {time.perf_counter() - started:.1f}s"
+            )
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            logger.error(f"Whisper model unavailable: {self.error}")
+        finally:
+            self._ready.set()
+
+    def _wait_ready(self):
+        if not self._ready.wait(WHISPER_LOAD_TIMEOUT_SECONDS):
+            raise RuntimeError("Whisper model is still loading")
+        if self.model is None:
+            raise RuntimeError(f"Whisper model unavailable: {self.error}")
+
+    def transcribe(self, audio_path: str) -> Dict:
+        """Transcribe one clip, returning text, language, duration and real-time factor"""
+        self._wait_ready()
+        
+        import whisper
+        
+        audio = load_transcription_audio(audio_path)
+        duration = len(audio) / whisper.audio.SAMPLE_RATE
+        
+        started = time.perf_counter()
+        with self._lock:
+            result = self.model.transcribe(audio, fp16=self.device == "cuda", language=WHISPER_LANGUAGE)
+        elapsed = time.perf_counter() - started
+        
+        real_time_factor = elapsed / duration if duration else 0.0
+        logger.info(
+            f"Transcribed {os.path.basename(audio_path)}: {duration:.1f}s audio in {elapsed:.2f}s "
+            f"(RTF {real_time_factor:.2f}, model {self.model_size})"
+        )
+        return {
+            'text': result['text'].strip(),
+            'language': result.get('language'),
+            'duration_seconds': duration,
+            'real_time_factor': real_time_factor,
+            'model': self.model_size
+        }
+
+    def transcribe_segment(self, audio, prompt: Optional[str] = None) -> str:
+        """Decode one short clip (up to 30 s) conditioned on the text before it.
+
+        Used for partial transcripts: passing the previous text as prompt keeps
+        the decoder's context across segments without re-decoding the audio.
+        """
+        self._wait_ready()
+        
+        import torch
+        import whisper
+        
+        window = torch.from_numpy(whisper.pad_or_trim(audio)).to(self.device)
+        mel = whisper.log_mel_spectrogram(window, self.n_mels)
+        options = whisper.DecodingOptions(
+            language=WHISPER_LANGUAGE,
+            fp16=self.device == "cuda",
+            without_timestamps=True,
+            prompt=prompt or None
+        )
+        with self._lock:
+            result = whisper.decode(self.model, mel, options)
+        return result.text.strip()
+
+    def transcribe_batch(self, audio_paths: List[str], batch_size: int = WHISPER_BATCH_SIZE) -> List:
+        """Transcribe several clips together.
+
+        Every clip is split into overlapping windows, which are turned into
+        log-mel features and decoded ``batch_size`` at a time (one vectorised
+        call per batch), then each clip's window texts are stitched back together. Returns
+        one result dict (as transcribe()) or exception per path, in order.
+        """
+        self._wait_ready()
+        
+        import numpy as np
+        import torch
+        import whisper
+        
+        sample_rate = whisper.audio.SAMPLE_RATE
+        results = [None] * len(audio_paths)
+        clips = []
+        windows = []
+        for index, audio_path in enumerate(audio_paths):
+            try:
+                audio = load_transcription_audio(audio_path)
+            except Exception as e:
+                results[index] = e
+                continue
+            chunks = split_audio_chunks(audio, sample_rate)
+            clips.append((index, len(chunks), len(audio) / sample_rate))
+            windows.extend(whisper.pad_or_trim(chunk) for chunk in chunks)
+        
+        if not windows:
+            return results
+        
+        started = time.perf_counter()
+        options = whisper.DecodingOptions(
+            language=WHISPER_LANGUAGE,
+            fp16=self.device == "cuda",
+            without_timestamps=True
+        )
+        decoded = []
+        with self._lock:
+            for start in range(0, len(windows), batch_size):
+                # Features for one decode batch at a time: long clips add up to
+                # hundreds of windows, too many to hold as STFTs all at once
+                batch = torch.from_numpy(np.stack(windows[start:start + batch_size])).to(self.device)
+                mel = batch_log_mel_spectrogram(batch, self.device, self.n_mels)
+                decoded.extend(whisper.decode(self.model, mel, options))
+        elapsed = time.perf_counter() - started
+        
+        audio_seconds = sum(duration for _, _, duration in clips)
+        throughput = audio_seconds / elapsed if elapsed else 0.0
+        logger.info(
+            f"Transcribed {len(clips)} clips ({len(windows)} windows, batch size {batch_size}): "
+            f"{audio_seconds:.1f}s audio in {elapsed:.2f}s = {throughput:.1f} audio-s per wall-s"
+        )
+        
+        offset = 0
+        for index, window_count, duration in clips:
+            clip_windows = decoded[offset:offset + window_count]
+            offset += window_count
+            # Every window is padded to 30 s and costs the same to decode, so a
+            # clip's share of the batch time follows its window count
+            clip_elapsed = elapsed * window_count / len(windows)
+            real_time_factor = clip_elapsed / duration if duration else 0.0
+            logger.info(
+                f"Transcribed {os.path.basename(audio_paths[index])}: {duration:.1f}s audio in "
+                f"~{clip_elapsed:.2f}s of the batch (RTF {real_time_factor:.2f}, model {self.model_size})"
+            )
+            results[index] = {
+                'text': stitch_chunk_texts([window.text for window in clip_windows]),
+                'language': clip_windows[0].language,
+                'duration_seconds': duration,
+                'real_time_factor': real_time_factor,
+                'model': self.model_size
+            }
+        return results
+
+    def measure_throughput(self, audio_paths: List[str], batch_sizes=(1, 2, 4, 8, 16)) -> Dict[int, float]:
+        """Audio-seconds transcribed per wall-second for each batch size"""
+        import whisper
+        
+        audio_seconds = sum(len(load_transcription_audio(path)) / whisper.audio.SAMPLE_RATE for path in audio_paths)
+        throughput = {}
+        for batch_size in batch_sizes:
+            started = time.perf_counter()
+            self.transcribe_batch(audio_paths, batch_size)
+            throughput[batch_size] = audio_seconds / (time.perf_counter() - started)
+        return throughput
+
+def load_transcription_audio(audio_path: str):
+    """Float32 16 kHz samples for Whisper, read from the PCM copy when there is one.
+
+    The PCM copy is already at Whisper's rate, so it is read directly instead of
+    running ffmpeg on the Opus blob.
+    """
+    pcm_path = pcm_audio_path(audio_path)
+    if not os.path.exists(pcm_path):
+        import whisper
+        return whisper.load_audio(audio_path)
+    
+    import numpy as np
+    
+    with wave.open(pcm_path, 'rb') as f:
+        frames = f.readframes(f.getnframes())
+    return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+
+def split_audio_chunks(audio, sample_rate: int, chunk_seconds: float = WHISPER_CHUNK_SECONDS,
+                       overlap_seconds: float = WHISPER_CHUNK_OVERLAP_SECONDS) -> List:
+    """Cut audio into windows of at most chunk_seconds that overlap by overlap_seconds"""
+    chunk = int(chunk_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    if len(audio) <= chunk:
+        return [audio]
+    return [audio[start:start + chunk] for start in range(0, len(audio) - overlap, chunk - overlap)]
+
+def batch_log_mel_spectrogram(batch, device: str, n_mels: int):
+    """whisper.log_mel_spectrogram for a (clips, samples) tensor in one pass.
+
+    The -8 dB dynamic range floor is taken per clip; whisper's own function
+    would take it over the whole batch when handed a 2-D tensor.
+    """
+    import torch
+    import whisper
+    
+    window = torch.hann_window(whisper.audio.N_FFT, device=device)
+    stft = torch.stft(batch, whisper.audio.N_FFT, whisper.audio.HOP_LENGTH, window=window, return_complex=True)
+    magnitudes = stft[..., :-1].abs() ** 2
+    mel_spec = whisper.audio.mel_filters(device, n_mels) @ magnitudes
+    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(-2, -1), keepdim=True) - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+def stitch_chunk_texts(texts: List[str], max_overlap_words: int = WHISPER_STITCH_MAX_WORDS) -> str:
+    """Join window transcripts, dropping words repeated across the overlap"""
+    def normalise(word: str) -> str:
+        return ''.join(ch for ch in word.lower() if ch.isalnum())
+    
+    words = []
+    for text in texts:
+        next_words = text.split()
+        # Longest suffix of what we have that the next window starts with
+        for size in range(min(max_overlap_words, len(words), len(next_words)), 0, -1):
+            if [normalise(w) for w in words[-size:]] == [normalise(w) for w in next_words[:size]]:
+                next_words = next_words[size:]
+                break
+        words.extend(next_words)
+    return ' '.join(words)
+
+@st.cache_resource
+def get_transcription_service() -> TranscriptionService:
+    return TranscriptionService()
+
+
+class PartialTranscriber:
+    """Transcribes audio incrementally while it is still being recorded.
+
+    feed() takes 16 kHz float samples from any source (live capture, or a saved
+    recording read in chunks) and runs a cheap energy VAD to cut segments at
+    pauses. A worker thread decodes each closed segment once, prompted with the
+    tail of the text so far, so the buffer is never re-transcribed. Latency is
+    measured from the end of a segment's audio to its text being available.
+    """
+
+    def __init__(self, service: TranscriptionService):
+        import numpy as np
+        
+        self._service = service
+        self._lock = threading.Lock()
+        self._segments = queue.Queue()
+        self._frame_length = int(AUDIO_SAMPLE_RATE * PARTIAL_VAD_FRAME_SECONDS)
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._open_frames = []
+        self._silent_frames = 0
+        self._last_interim = 0.0
+        self._committed = []
+        self._interim = ""
+        self._latencies = deque(maxlen=200)
+        self.closed = False
+        self.finished = False
+        self.error = None
+        threading.Thread(target=self._run, name="partial-transcriber", daemon=True).start()
+
+    @property
+    def text(self) -> str:
+        with self._lock:
+            return " ".join(self._committed + ([self._interim] if self._interim else []))
+
+    def latency_stats(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return {'segments': 0}
+        return {
+            'segments': len(latencies),
+            'p50_seconds': latencies[len(latencies) // 2],
+            'max_seconds': latencies[-1]
+        }
+
+    def feed(self, samples):
+        """Add mono 16 kHz float32 samples"""
+        import numpy as np
+        
+        with self._lock:
+            if self.closed:
+                return
+            samples = np.concatenate((self._carry, samples))
+            frame_count = len(samples) // self._frame_length
+            self._carry = samples[frame_count * self._frame_length:]
+            if frame_count == 0:
+                return
+            frames = samples[:frame_count * self._frame_length].reshape(frame_count, self._frame_length)
+            voiced = frame_levels_db(frames) > PARTIAL_VAD_THRESHOLD_DBFS
+            
+            pause_frames = PARTIAL_SEGMENT_PAUSE_SECONDS / PARTIAL_VAD_FRAME_SECONDS
+            max_frames = PARTIAL_SEGMENT_MAX_SECONDS / PARTIAL_VAD_FRAME_SECONDS
+            for frame, is_voiced in zip(frames, voiced):
+                if not self._open_frames and not is_voiced:
+                    continue  # silence between segments
+                self._open_frames.append(frame)
+                self._silent_frames = 0 if is_voiced else self._silent_frames + 1
+                if self._silent_frames >= pause_frames or len(self._open_frames) >= max_frames:
+                    self._close_segment()
+
+    def feed_file(self, pcm_path: str, chunk_seconds: float = 0.5):
+        """Feed a 16 kHz PCM WAV in chunks from a background thread, then close"""
+        import numpy as np
+        
+        def read():
+            try:
+                with wave.open(pcm_path, 'rb') as f:
+                    while True:
+                        frames = f.readframes(int(AUDIO_SAMPLE_RATE * chunk_seconds))
+                        if not frames:
+                            break
+                        self.feed(np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0)
+            except Exception as e:
+                self.error = str(e)
+            self.close()
+        
+        threading.Thread(target=read, name="partial-transcriber-feed", daemon=True).start()
+
+    def close(self):
+        """No more audio: decode what is left and let the worker finish"""
+        with self._lock:
+            if self.closed:
+                return
+            self._close_segment()
+            self.closed = True
+        self._segments.put(None)
+
+    def _close_segment(self):
+        # Caller holds the lock
+        import numpy as np
+        
+        if len(self._open_frames) * PARTIAL_VAD_FRAME_SECONDS >= PARTIAL_SEGMENT_MIN_SECONDS:
+            self._segments.put((np.concatenate(self._open_frames), time.monotonic()))
+        self._open_frames = []
+        self._silent_frames = 0
+
+    def _prompt(self) -> str:
+        with self._lock:
+            return " ".join(" ".join(self._committed).split()[-PARTIAL_PROMPT_WORDS:])
+
+    def _run(self):
+        while True:
+            try:
+                item = self._segments.get(timeout=PARTIAL_INTERIM_SECONDS / 2)
+            except queue.Empty:
+                self._decode_interim()
+                continue
+            if item is None:
+                break
+            audio, ended_at = item
+            try:
+                text = self._service.transcribe_segment(audio, self._prompt())
+            except Exception as e:
+                self.error = str(e)
+                logger.warning(f"Partial transcription failed: {e}")
+                break
+            with self._lock:
+                if text:
+                    self._committed.append(text)
+                self._interim = ""
+                self._latencies.append(time.monotonic() - ended_at)
+        
+        stats = self.latency_stats()
+        if stats['segments']:
+            logger.info(
+                f"Partial transcription: {stats['segments']} segments, latency p50 "
+                f"{stats['p50_seconds']:.2f}s, max {stats['max_seconds']:.2f}s"
+            )
+        self.finished = True
+
+    def _decode_interim(self):
+        import numpy as np
+        
+        with self._lock:
+            if (self.closed or not self._open_frames
+                    or time.monotonic() - self._last_interim < PARTIAL_INTERIM_SECONDS):
+                return
+            audio = np.concatenate(self._open_frames)
+            self._last_interim = time.monotonic()
+        try:
+            text = self._service.transcribe_segment(audio, self._prompt())
+        except Exception as e:
+            self.error = str(e)
+            return
+        with self._lock:
+            # The segment may have been closed meanwhile; its final text replaces this
+            if self._open_frames:
+                self._interim = text
+
+def parse_media_paths(media_path: Optional[str]) -> List[Tuple[str, str]]:
+    """Split an alert's media_path into (kind, path) pairs"""
+    if not media_path:
+        return []
+    media = []
+    for media_file in media_path.split(','):
+        kind, sep, path = media_file.partition(':')
+        if sep and kind in ('image', 'audio'):
+            media.append((kind, path))
+        else:
+            media.append(('', media_file))
+    return media
+
+def store_transcript(alert_id: int, media_path: str, transcript: Dict):
+    with get_db_pool().transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO transcripts
+            (alert_id, media_path, text, language, duration_seconds, real_time_factor, model)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            alert_id,
+            media_path,
+            transcript['text'],
+            transcript['language'],
+            transcript['duration_seconds'],
+            transcript['real_time_factor'],
+            transcript['model']
+        ))
+
+def get_transcripts(alert_id: int) -> Dict[str, Dict]:
+    """Transcripts of an alert's audio evidence, keyed by media path"""
+    def load():
+        with get_db_pool().connection() as conn:
+            rows = conn.execute('''
+                SELECT media_path, text, language, duration_seconds, real_time_factor, model
+                FROM transcripts WHERE alert_id = ?
+            ''', (alert_id,)).fetchall()
+        return {
+            row[0]: {
+                'text': row[1],
+                'language': row[2],
+                'duration_seconds': row[3],
+                'real_time_factor': row[4],
+                'model': row[5]
+            }
+            for row in rows
+        }
+    
+    return get_alert_cache().get_or_load(('transcripts', alert_id), load)
+
+def run_transcription_jobs(jobs: List[Dict]) -> Dict[int, object]:
+    """Batch handler: transcribe the audio of every claimed alert together"""
+    alert_ids = [job['alert_id'] for job in jobs]
+    placeholders = ','.join('?' * len(alert_ids))
+    with get_db_pool().connection() as conn:
+        rows = conn.execute(
+            f'SELECT id, media_path, priority_source FROM alerts WHERE id IN ({placeholders})',
+            tuple(alert_ids)
+        ).fetchall()
+    media_paths = {alert_id: media_path for alert_id, media_path, _ in rows}
+    explicit_priority = {alert_id for alert_id, _, source in rows if source in EXPLICIT_PRIORITY_SOURCES}
+    
+    # A job may name specific clips (e.g. audio added by a merged report)
+    clips = [
+        (job, path)
+        for job in jobs
+        for kind, path in parse_media_paths(media_paths.get(job['alert_id']))
+        if kind == 'audio' and path in job['payload'].get('media_paths', [path])
+    ]
+    outcomes = {job['id']: {'clips': 0} for job in jobs}
+    if not clips:
+        return outcomes
+    
+    results = get_transcription_service().transcribe_batch([path for _, path in clips])
+    for (job, path), result in zip(clips, results):
+        if isinstance(outcomes[job['id']], Exception):
+            continue
+        if isinstance(result, Exception):
+            outcomes[job['id']] = result
+            continue
+        store_transcript(job['alert_id'], path, result)
+        outcomes[job['id']]['clips'] += 1
+    
+    # Now that the transcripts exist, let the LLM take them into account,
+    # unless whoever reported the alert set its priority
+    with get_db_pool().transaction() as conn:
+        for job in jobs:
+            if not isinstance(outcomes[job['id']], Exception) and job['alert_id'] not in explicit_priority:
+                enqueue_job(conn, 'priority', job['alert_id'], idempotency_key=f"priority:{job['alert_id']}")
+    get_job_workers().notify('priority')
+    return outcomes
+
+def has_audio_evidence(alert_data: Dict) -> bool:
+    return any(kind == 'audio' for kind, _ in parse_media_paths(alert_data.get('media_path')))
+
+register_job_handler(
+    'transcription',
+    run_transcription_jobs,
+    concurrency=WHISPER_WORKERS,
+    applies_to=has_audio_evidence,
+    batch_size=WHISPER_BATCH_SIZE
+)
+
+# Similar-incident search
+#
+# TF-IDF over the titles and descriptions of the most recent alerts. Raw term
+# counts are kept per document and idf is applied at query time, so adding or
+# evicting an alert only touches that document's terms and the document
+# frequencies; nothing is re-vectorised. The index is built lazily on first use
+# and catches up on alerts inserted by other processes with an id range query.
+SIMILARITY_STOPWORDS = frozenset(
+    'a an and are as at be been by for from has have in is it its of on or that the '
+    'there this to was were with incident'.split()
+)
+
+def tokenize_report(text: str) -> List[str]:
+    return [
+        token for token in normalise_report_text(text).split()
+        if len(token) > 1 and token not in SIMILARITY_STOPWORDS
+    ]
+
+class SimilarityIndex:
+    def __init__(self, max_documents: int = SIMILARITY_INDEX_SIZE):
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        self._documents = deque()
+        self._vocabulary: Dict[str, int] = {}
+        # Column -> token, and columns freed when their last document was evicted
+        self._columns: List[Optional[str]] = []
+        self._free_columns = []
+        self._document_frequency = []
+        # The matrix's first _evicted rows are evicted documents; _pending holds
+        # the documents added since it was last extended
+        self._matrix = None
+        self._evicted = 0
+        self._pending = deque()
+        self._last_alert_id = None
+
+    def _ensure_loaded(self):
+        """Build from the database on first use, then pick up newer alerts"""
+        with get_db_pool().connection() as conn:
+            if self._last_alert_id is None:
+                rows = conn.execute('''
+                    SELECT id, title, description, department, priority FROM alerts
+                    ORDER BY id DESC LIMIT ?
+                ''', (self.max_documents,)).fetchall()
+                rows.reverse()
+                self._last_alert_id = 0
+            else:
+                rows = conn.execute('''
+                    SELECT id, title, description, department, priority FROM alerts
+                    WHERE id > ? ORDER BY id
+                ''', (self._last_alert_id,)).fetchall()
+        for row in rows:
+            self._add(*row)
+
+    def _column(self, token: str) -> int:
+        column = self._vocabulary.get(token)
+        if column is None:
+            if self._free_columns:
+                column = self._free_columns.pop()
+                self._columns[column] = token
+            else:
+                column = len(self._columns)
+                self._columns.append(token)
+                self._document_frequency.append(0)
+            self._vocabulary[token] = column
+        return column
+
+    def _add(self, alert_id: int, title: str, description: str, department: str, priority: str):
+        if alert_id <= self._last_alert_id:
+            return
+        counts = {}
+        for token in tokenize_report(f"{title} {description or ''}"):
+            column = self._column(token)
+            counts[column] = counts.get(column, 0) + 1
+        for column in counts:
+            self._document_frequency[column] += 1
+        
+        document = {
+            'id': alert_id,
+            'title': title,
+            'department': department,
+            'priority': priority,
+            'terms': counts
+        }
+        self._documents.append(document)
+        self._pending.append(document)
+        if len(self._documents) > self.max_documents:
+            self._evict()
+        self._last_alert_id = alert_id
+
+    def _evict(self):
+        """Drop the oldest document, freeing the columns of terms no other document has"""
+        for column in self._documents.popleft()['terms']:
+            self._document_frequency[column] -= 1
+            if not self._document_frequency[column]:
+                del self._vocabulary[self._columns[column]]
+                self._columns[column] = None
+                self._free_columns.append(column)
+        if self._matrix is not None and self._evicted < self._matrix.shape[0]:
+            self._evicted += 1
+        else:
+            self._pending.popleft()
+
+    def add_alert(self, alert_id: int, alert_data: Dict):
+        """Incremental update from create_alert; a no-op until the index is first used"""
+        with self._lock:
+            if self._last_alert_id is None:
+                return
+            if alert_id > self._last_alert_id + 1:
+                # Alerts from other processes came in between; this one is committed
+                # too, so catching up adds it in id order
+                self._ensure_loaded()
+            else:
+                self._add(alert_id, alert_data['title'], alert_data['description'],
+                          alert_data['department'], alert_data['priority'])
+
+    def _term_matrix(self):
+        """Sublinear term-frequency matrix (documents x vocabulary columns).
+
+        Evicted rows are sliced off the front and new documents appended, so
+        existing rows are never re-vectorised. A freed column is only reused by
+        documents added after every row that had it was evicted.
+        """
+        import numpy as np
+        from scipy import sparse
+        
+        shape = (len(self._documents), len(self._columns))
+        if self._matrix is not None and self._matrix.shape == shape and not self._pending and not self._evicted:
+            return self._matrix
+        
+        indptr = [0]
+        indices = []
+        data = []
+        for document in self._pending:
+            indices.extend(document['terms'].keys())
+            data.extend(document['terms'].values())
+            indptr.append(len(indices))
+        added = sparse.csr_matrix(
+            (1.0 + np.log(np.asarray(data, dtype=np.float64)), indices, indptr),
+            shape=(len(self._pending), shape[1])
+        )
+        if self._matrix is None:
+            self._matrix = added
+        else:
+            kept = self._matrix[self._evicted:]
+            kept.resize((kept.shape[0], shape[1]))
+            self._matrix = sparse.vstack([kept, added], format='csr')
+        self._evicted = 0
+        self._pending.clear()
+        return self._matrix
+
+    def find_similar(self, text: str, k: int = SIMILARITY_TOP_K, min_score: float = 0.1) -> List[Dict]:
+        """Top-k past alerts by cosine similarity to the text"""
+        import numpy as np
+        
+        with self._lock:
+            self._ensure_loaded()
+            if not self._documents:
+                return []
+            
+            query = {}
+            for token in tokenize_report(text):
+                if token in self._vocabulary:
+                    column = self._vocabulary[token]
+                    query[column] = query.get(column, 0) + 1
+            if not query:
+                return []
+            
+            matrix = self._term_matrix()
+            document_frequency = np.asarray(self._document_frequency, dtype=np.float64)
+            idf = np.log((1 + len(self._documents)) / (1 + document_frequency)) + 1.0
+            
+            columns = np.fromiter(query.keys(), dtype=np.int64)
+            query_weights = (1.0 + np.log(np.fromiter(query.values(), dtype=np.float64))) * idf[columns]
+            dots = matrix[:, columns] @ (query_weights * idf[columns])
+            norms = np.sqrt(matrix.multiply(matrix) @ (idf ** 2))
+            scores = dots / (np.maximum(norms, 1e-12) * np.linalg.norm(query_weights))
+            
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    'id': self._documents[i]['id'],
+                    'title': self._documents[i]['title'],
+                    'department': self._documents[i]['department'],
+                    'priority': self._documents[i]['priority'],
+                    'score': float(scores[i])
+                }
+                for i in top if scores[i] >= min_score
+            ]
 
-def resolve_alert(alert_id: int, resolved_by: str) -> bool:
+@st.cache_resource
+def get_similarity_index() -> SimilarityIndex:
+    return SimilarityIndex()
+
+def find_similar_alerts(location: str, description: str, k: int = SIMILARITY_TOP_K) -> List[Dict]:
     try:
-        conn = sqlite3.connect('emergency_alerts.db')
-        c = conn.cursor()
-        
-        c.execute('''
-            UPDATE alerts 
-            SET status = 'resolved', resolved_at = CURRENT_TIMESTAMP, resolved_by = ?
-            WHERE id = ?
-        ''', (resolved_by, alert_id))
+        return get_similarity_index().find_similar(f"{location} {description}", k)
+    except Exception as e:
+        logger.warning(f"Similar-incident search unavailable: {e}")
+        return []
+
+def suggest_from_similar(similar: List[Dict]) -> Dict[str, Optional[str]]:
+    """Score-weighted priority and department votes of similar past alerts"""
+    suggestion = {'priority': None, 'department': None}
+    for field in suggestion:
+        votes = {}
+        for alert in similar:
+            votes[alert[field]] = votes.get(alert[field], 0.0) + alert['score']
+        total = sum(votes.values())
+        if votes:
+            best = max(votes, key=votes.get)
+            if votes[best] >= SIMILARITY_SUGGESTION_MIN_SCORE and votes[best] / total > 0.5:
+                suggestion[field] = best
+    return suggestion
+
+# Near-duplicate detection
+#
+# Each alert stores a MinHash signature of its location and description
+# shingles. The signature is cut into LSH bands, and active alerts have one
+# alert_lsh row per band, so finding candidates for a new report is an indexed
+# lookup per band rather than a scan of every active alert. Rows are removed
+# when an alert is resolved, keeping the buckets limited to active alerts.
+def report_shingles(title: str, description: Optional[str]) -> set:
+    """Word unigrams and bigrams of the location and description"""
+    tokens = tokenize_report(f"{title} {description or ''}")
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+@st.cache_resource
+def minhash_permutations():
+    import numpy as np
+    rng = np.random.default_rng(MINHASH_SEED)
+    a = rng.integers(1, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+    return a, b
+
+def compute_minhash(title: str, description: Optional[str]) -> Optional[bytes]:
+    """MinHash signature as bytes, or None if numpy is unavailable or the text is empty"""
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    
+    shingles = report_shingles(title, description)
+    if not shingles:
+        return None
+    
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), 'little') for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    a, b = minhash_permutations()
+    # (a*x + b) mod p for every permutation and shingle at once; a, x < 2^32 so no overflow
+    signature = ((np.outer(a, hashes) + b[:, None]) % MINHASH_PRIME).min(axis=1)
+    return signature.astype(np.uint32).tobytes()
+
+def lsh_buckets(signature: bytes) -> List[Tuple[int, int]]:
+    """(band, bucket) pairs for a signature"""
+    band_bytes = len(signature) // MINHASH_BANDS
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(signature[band * band_bytes:(band + 1) * band_bytes], digest_size=8).digest(),
+            'little', signed=True
+        ))
+        for band in range(MINHASH_BANDS)
+    ]
+
+def minhash_similarity(first: bytes, second: bytes) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    import numpy as np
+    return float(np.mean(np.frombuffer(first, dtype=np.uint32) == np.frombuffer(second, dtype=np.uint32)))
+
+def index_alert_signature(conn: sqlite3.Connection, alert_id: int, signature: Optional[bytes]):
+    if signature is None:
+        return
+    conn.execute('UPDATE alerts SET minhash = ? WHERE id = ?', (signature, alert_id))
+    conn.executemany(
+        'INSERT OR REPLACE INTO alert_lsh (alert_id, band, bucket) VALUES (?, ?, ?)',
+        [(alert_id, band, bucket) for band, bucket in lsh_buckets(signature)]
+    )
+
+@st.cache_resource
+def backfill_alert_signatures() -> int:
+    """Sign active alerts created before duplicate detection existed (once per process)"""
+    with get_db_pool().connection() as conn:
+        rows = conn.execute(
+            "SELECT id, title, description FROM alerts WHERE status = 'active' AND minhash IS NULL"
+        ).fetchall()
+    if rows:
+        with get_db_pool().transaction() as conn:
+            for alert_id, title, description in rows:
+                index_alert_signature(conn, alert_id, compute_minhash(title, description))
+        logger.info(f"Computed MinHash signatures for {len(rows)} active alerts")
+    return len(rows)
+
+def find_duplicate_alerts(alert_data: Dict, threshold: float = DUPLICATE_THRESHOLD) -> List[Dict]:
+    """Active alerts that are likely the same incident as a new report.
+
+    Stores the report's signature in alert_data['minhash'] so create_alert
+    doesn't compute it again.
+    """
+    signature = compute_minhash(alert_data['title'], alert_data['description'])
+    alert_data['minhash'] = signature
+    if signature is None:
+        return []
+    
+    backfill_alert_signatures()
+    buckets = lsh_buckets(signature)
+    band_filter = ' OR '.join(['(l.band = ? AND l.bucket = ?)'] * len(buckets))
+    with get_db_pool().connection() as conn:
+        rows = conn.execute(f'''
+            SELECT DISTINCT a.id, a.title, a.department, a.priority, a.created_by, a.created_at, a.minhash
+            FROM alert_lsh l JOIN alerts a ON a.id = l.alert_id
+            WHERE ({band_filter}) AND a.status = 'active'
+        ''', tuple(value for bucket in buckets for value in bucket)).fetchall()
+    
+    duplicates = []
+    for alert_id, title, department, priority, created_by, created_at, minhash in rows:
+        similarity = minhash_similarity(signature, minhash)
+        if similarity >= threshold:
+            duplicates.append({
+                'id': alert_id,
+                'title': title,
+                'department': department,
+                'priority': priority,
+                'created_by': created_by,
+                'created_at': created_at,
+                'similarity': similarity
+            })
+    return sorted(duplicates, key=lambda d: d['similarity'], reverse=True)
+
+def merge_report_into_alert(alert_id: int, alert_data: Dict) -> bool:
+    """Attach a duplicate report's evidence to an existing alert instead of creating a row"""
+    try:
+        with get_db_pool().transaction() as conn:
+            row = conn.execute('SELECT media_path FROM alerts WHERE id = ?', (alert_id,)).fetchone()
+            if row is None:
+                return False
+            
+            c = conn.execute('''
+                INSERT INTO alert_reports (alert_id, description, media_path, created_by)
+                VALUES (?, ?, ?, ?)
+            ''', (alert_id, alert_data['description'], alert_data.get('media_path'), alert_data['created_by']))
+            report_id = c.lastrowid
+            
+            merged_paths = [path for path in (row[0], alert_data.get('media_path')) if path]
+            conn.execute(
+                'UPDATE alerts SET media_path = ?, report_count = report_count + 1 WHERE id = ?',
+                (','.join(merged_paths) or None, alert_id)
+            )
+            add_media_refs(conn, alert_id, alert_data.get('media_path'))
+            
+            # Transcribe only the audio this report brought in
+            new_audio = [path for kind, path in parse_media_paths(alert_data.get('media_path')) if kind == 'audio']
+            if new_audio:
+                enqueue_job(conn, 'transcription', alert_id, payload={'media_paths': new_audio},
+                            idempotency_key=f"transcription:{alert_id}:report:{report_id}")
         
-        conn.commit()
-        conn.close()
+        get_alert_cache().bump()
+        if new_audio:
+            get_job_workers().notify('transcription')
         return True
     except Exception as e:
-        logger.error(f"Error resolving alert: {e}")
+        logger.error(f"Error merging report into alert {alert_id}: {e}")
         return False
 
-def display_audio_player(audio_path: str):
+# Priority classification
+#
+# An ollama model assigns priority from the report text, under a hard latency
+# budget. Answers are cached in memory and in the priority_cache table, keyed by
+# a hash of the normalised text, so repeated or identical reports skip the LLM.
+# When the model is slow or unreachable the keyword rules below decide, and a
+# late LLM answer still lands in the cache for the next identical report.
+PRIORITY_RULES = {
+    'high': (
+        'fire', 'smoke', 'flame', 'burning', 'explosion', 'explode', 'gas leak',
+        'unconscious', 'not breathing', 'bleeding', 'blood', 'heart attack',
+        'seizure', 'collapsed', 'trapped', 'electrocut', 'weapon', 'gun',
+        'chemical', 'toxic', 'injured', 'injury', 'choking', 'overdose'
+    ),
+    'medium': (
+        'leak', 'sparks', 'smell', 'broken', 'damage', 'flood', 'water',
+        'sick', 'dizzy', 'faint', 'fall', 'fell', 'outage', 'stolen',
+        'missing', 'alarm', 'stuck', 'threat', 'hazard'
+    )
+}
+
+PRIORITY_PROMPT = """You triage workplace incident reports for an emergency response team.
+Classify the report's priority:
+- high: risk to life or health, or a hazard that can spread (fire, smoke, injury, gas, violence)
+- medium: damage or disruption that needs attention today, with no immediate danger to people
+- low: routine issues such as lost items or minor faults
+Reply with JSON only: {"priority": "high" | "medium" | "low"}"""
+
+def normalise_report_text(*parts: Optional[str]) -> str:
+    text = ' '.join(part for part in parts if part).lower()
+    text = ''.join(ch if ch.isalnum() else ' ' for ch in text)
+    return ' '.join(text.split())
+
+def rule_based_priority(text: str) -> str:
+    """Keyword fallback used when the LLM misses its latency budget"""
+    padded = f" {normalise_report_text(text)} "
+    for priority in ('high', 'medium'):
+        if any(f" {keyword}" in padded for keyword in PRIORITY_RULES[priority]):
+            return priority
+    return 'low'
+
+class PriorityClassifier:
+    def __init__(self, host: str = OLLAMA_HOST, model: str = OLLAMA_MODEL):
+        self.host = host
+        self.model = model
+        self._executor = ThreadPoolExecutor(max_workers=PRIORITY_LLM_WORKERS, thread_name_prefix="priority-llm")
+        # Timed-out requests keep running, so without a bound a slow LLM
+        # would let the executor's queue grow with every report
+        self._pending = threading.BoundedSemaphore(PRIORITY_LLM_MAX_PENDING)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._client = None
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{text}".encode()).hexdigest()
+
+    def _cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        with get_db_pool().connection() as conn:
+            row = conn.execute('SELECT priority FROM priority_cache WHERE text_hash = ?', (key,)).fetchone()
+        if row:
+            self._remember(key, row[0], persist=False)
+            return row[0]
+        return None
+
+    def _remember(self, key: str, priority: str, persist: bool = True):
+        with self._lock:
+            self._memory[key] = priority
+            self._memory.move_to_end(key)
+            while len(self._memory) > PRIORITY_CACHE_MAX_ENTRIES:
+                self._memory.popitem(last=False)
+        if persist:
+            with get_db_pool().transaction() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO priority_cache (text_hash, priority, model) VALUES (?, ?, ?)',
+                    (key, priority, self.model)
+                )
+
+    def _ask_llm(self, text: str, key: str) -> str:
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(host=self.host, timeout=PRIORITY_LLM_TIMEOUT_SECONDS)
+        
+        response = self._client.chat(
+            model=self.model,
+            messages=[
+                {'role': 'system', 'content': PRIORITY_PROMPT},
+                {'role': 'user', 'content': text}
+            ],
+            format='json',
+            options={'temperature': 0}
+        )
+        priority = json.loads(response['message']['content']).get('priority', '').strip().lower()
+        if priority not in PRIORITY_RANKS:
+            raise ValueError(f"Unexpected priority from model: {priority!r}")
+        self._remember(key, priority)
+        return priority
+
+    def classify(self, location: str, description: str, transcript: Optional[str] = None,
+                 budget_seconds: float = PRIORITY_SUBMIT_BUDGET_SECONDS,
+                 similar: Optional[List[Dict]] = None) -> Dict:
+        """Priority for a report, never taking much longer than ``budget_seconds``.
+
+        Returns {'priority', 'source', 'elapsed'} where source is 'cache',
+        'llm', 'similar' (a clear vote of similar past alerts) or 'rules'.
+        """
+        started = time.perf_counter()
+        text = normalise_report_text(location, description, transcript)
+        key = self._cache_key(text)
+        
+        cached = self._cached(key)
+        if cached:
+            return {'priority': cached, 'source': 'cache', 'elapsed': time.perf_counter() - started}
+        
+        prompt = f"Location: {location}\nDescription: {description}"
+        if transcript:
+            prompt += f"\nAudio transcript: {transcript}"
+        
+        try:
+            if not self._pending.acquire(blocking=False):
+                raise FutureTimeoutError()
+            future = self._executor.submit(self._ask_llm, prompt, key)
+            future.add_done_callback(lambda _: self._pending.release())
+            priority = future.result(timeout=budget_seconds)
+            source = 'llm'
+        except Exception as e:
+            # A timed-out request keeps running and fills the cache when it returns
+            if not isinstance(e, FutureTimeoutError):
+                logger.warning(f"Priority LLM unavailable: {e}")
+            suggested = suggest_from_similar(similar or [])['priority']
+            if suggested:
+                priority, source = suggested, 'similar'
+            else:
+                priority, source = rule_based_priority(prompt), 'rules'
+        
+        elapsed = time.perf_counter() - started
+        logger.info(f"Priority '{priority}' from {source} in {elapsed * 1000:.0f} ms")
+        return {'priority': priority, 'source': source, 'elapsed': elapsed}
+
+@st.cache_resource
+def get_priority_classifier() -> PriorityClassifier:
+    return PriorityClassifier()
+
+def classify_priority(location: str, description: str, transcript: Optional[str] = None,
+                      budget_seconds: float = PRIORITY_SUBMIT_BUDGET_SECONDS,
+                      similar: Optional[List[Dict]] = None) -> Dict:
+    return get_priority_classifier().classify(location, description, transcript, budget_seconds, similar)
+
+def run_priority_job(job: Dict) -> Dict:
+    """Re-classify an alert with its transcripts and a relaxed budget"""
+    with get_db_pool().connection() as conn:
+        row = conn.execute(
+            'SELECT title, description, priority, priority_source FROM alerts WHERE id = ?', (job['alert_id'],)
+        ).fetchone()
+    if row is None:
+        return {'priority': None}
+    
+    title, description, current, source = row
+    if source in EXPLICIT_PRIORITY_SOURCES:
+        return {'priority': current, 'source': source}
+    transcript = ' '.join(t['text'] for t in get_transcripts(job['alert_id']).values())
+    # Same location text as at submission, so a cached answer for it is reused
+    result = classify_priority(incident_location(title), description, transcript or None, PRIORITY_JOB_BUDGET_SECONDS)
+    if result['source'] in ('rules', 'similar'):
+        # Retried with backoff; the priority set at submission stands meanwhile
+        raise RuntimeError("Priority LLM did not answer")
+    
+    if result['priority'] != current:
+        with get_db_pool().transaction() as conn:
+            conn.execute(
+                'UPDATE alerts SET priority = ?, priority_source = ? WHERE id = ?',
+                (result['priority'], result['source'], job['alert_id'])
+            )
+        get_alert_cache().bump()
+        logger.info(f"Alert {job['alert_id']} re-prioritised {current} -> {result['priority']}")
+    return {'priority': result['priority'], 'previous': current}
+
+def needs_priority_review(alert_data: Dict) -> bool:
+    # Audio reports are reviewed once their transcripts exist (see run_transcription_jobs)
+    return alert_data.get('priority_source') in ('rules', 'similar') and not has_audio_evidence(alert_data)
+
+register_job_handler(
+    'priority',
+    run_priority_job,
+    concurrency=PRIORITY_LLM_WORKERS,
+    applies_to=needs_priority_review
+)
+
+JOB_STATUS_ICONS = {'queued': '⏳', 'running': '⚙️', 'succeeded': '✅', 'failed': '❌'}
+
+def enrichment_summary(jobs: Optional[List[Dict]]) -> str:
+    """One-line summary of an alert's background enrichment jobs"""
+    if not jobs:
+        return ""
+    parts = [
+        f"{JOB_STATUS_ICONS.get(job['status'], '•')} {job['job_type'].replace('_', ' ')}"
+        for job in jobs
+    ]
+    return "Enrichment: " + " · ".join(parts)
+
+def render_enrichment_status(jobs: Optional[List[Dict]]):
+    summary = enrichment_summary(jobs)
+    if summary:
+        st.caption(summary)
+
+@st.cache_resource
+def media_url_secret() -> bytes:
+    return load_url_secret(MEDIA_DIR)
+
+@st.cache_resource
+def get_media_server():
+    """Serve stored media over HTTP from a background thread, once per process"""
+    if not MEDIA_SERVER_ENABLED:
+        return None
+    try:
+        server = create_media_server(MEDIA_SERVER_HOST, MEDIA_SERVER_PORT, MEDIA_DIR, media_url_secret())
+    except OSError as e:
+        logger.error(f"Media server could not listen on port {MEDIA_SERVER_PORT}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="media-server", daemon=True).start()
+    logger.info(f"Serving media on port {MEDIA_SERVER_PORT}")
+    return server
+
+def media_url_base() -> Optional[str]:
+    """Media server address for the current browser, or None to send media inline"""
+    if MEDIA_URL_BASE:
+        return MEDIA_URL_BASE
+    if get_media_server() is None:
+        return None
+    try:
+        host = st.context.headers.get("Host", "")
+    except Exception:
+        return None
+    # Only a browser on this machine (or a forwarded port) can reach it as
+    # localhost; a guessed address elsewhere would be unreachable or mixed content
+    if host.rsplit(":", 1)[0] in LOCAL_HOSTNAMES or host in LOCAL_HOSTNAMES:
+        return f"http://localhost:{MEDIA_SERVER_PORT}"
+    return None
+
+def media_url(path: str) -> str:
+    """Signed URL for a stored file; other paths, and all of them when there is
+    no reachable media server, are returned as is for Streamlit to send inline"""
+    relative_path = os.path.relpath(path, MEDIA_DIR)
+    base = media_url_base()
+    if relative_path.startswith(os.pardir) or base is None:
+        return path
+    expires = (int(time.time()) + MEDIA_URL_TTL_SECONDS) // MEDIA_URL_BUCKET_SECONDS * MEDIA_URL_BUCKET_SECONDS
+    return base + signed_media_path(relative_path, expires + MEDIA_URL_BUCKET_SECONDS, media_url_secret())
+
+def audio_mime_type(audio_path: str) -> str:
+    """Normalised recordings are Opus in OGG; older ones kept their original format"""
+    extension = os.path.splitext(audio_path)[1].lower()
+    return {'.ogg': 'audio/ogg', '.mp3': 'audio/mpeg', '.m4a': 'audio/mp4'}.get(extension, 'audio/wav')
+
+def display_audio_player(audio_path: str, transcript: Optional[Dict] = None):
     """Display audio player for audio files"""
     st.markdown("**🎤 Audio Evidence:**")
     try:
-        with open(audio_path, 'rb') as audio_file:
-            audio_bytes = audio_file.read()
-        
         # Display audio player
-        st.audio(audio_bytes, format="audio/wav")
+        st.audio(media_url(audio_path), format=audio_mime_type(audio_path))
+        
+        if transcript:
+            st.markdown(f"**Transcript:** {transcript['text'] or '_(no speech detected)_'}")
         
         # Show file info
-        file_size = len(audio_bytes) / (1024 * 1024)  # Convert to MB
+        file_size = os.path.getsize(audio_path) / (1024 * 1024)  # Convert to MB
         file_name = os.path.basename(audio_path)
         st.caption(f"Audio file: `{file_name}` ({file_size:.2f} MB)")
         
@@ -875,9 +3627,33 @@ def display_audio_player(audio_path: str):
         st.write(f"Audio path: {audio_path}")
         st.write(f"File exists: {os.path.exists(audio_path)}")
 
+def display_image(image_path: str, key: str):
+    """Display photo evidence as a thumbnail; larger versions load only when asked for"""
+    st.markdown("**📷 Photo Evidence:**")
+    try:
+        thumbnail_path = derivative_path(image_path, 'thumb')
+        if os.path.exists(thumbnail_path):
+            st.image(media_url(thumbnail_path), caption="Incident Photo")
+        elif get_image_derivatives().schedule(image_path):
+            # Older uploads, or generation still running
+            st.caption("Preview is being prepared")
+        else:
+            st.caption("No preview available for this photo")
+        
+        if st.checkbox("🔍 Enlarge photo", key=f"enlarge_{key}"):
+            medium_path = derivative_path(image_path, 'medium')
+            if os.path.exists(medium_path):
+                st.image(media_url(medium_path), use_column_width=True)
+            if not os.path.exists(medium_path) or st.checkbox("Load original file", key=f"original_{key}"):
+                st.image(media_url(image_path), caption="Original upload", use_column_width=True)
+    except Exception as e:
+        st.error(f"Error loading image: {e}")
+
 def display_media(alert: Dict):
     """Display media evidence for an alert"""
     if alert.get('media_path'):
+        transcripts = get_transcripts(alert['id'])
+        
         # Split media paths by comma and handle each one
         media_files = alert['media_path'].split(',')
         
@@ -902,19 +3678,9 @@ def display_media(alert: Dict):
                 if os.path.exists(image_path):
                     if has_photo and has_audio:
                         with col1:
-                            st.markdown("**📷 Photo Evidence:**")
-                            try:
-                                image = Image.open(image_path)
-                                st.image(image, caption="Incident Photo", use_column_width=True)
-                            except Exception as e:
-                                st.error(f"Error loading image: {e}")
+                            display_image(image_path, f"{alert['id']}_{image_path}")
                     else:
-                        st.markdown("**📷 Photo Evidence:**")
-                        try:
-                            image = Image.open(image_path)
-                            st.image(image, caption="Incident Photo", use_column_width=True)
-                        except Exception as e:
-                            st.error(f"Error loading image: {e}")
+                        display_image(image_path, f"{alert['id']}_{image_path}")
                 else:
                     st.warning(f"Photo file not found: {image_path}")
             
@@ -923,9 +3689,9 @@ def display_media(alert: Dict):
                 if os.path.exists(audio_path):
                     if has_photo and has_audio:
                         with col2:
-                            display_audio_player(audio_path)
+                            display_audio_player(audio_path, transcripts.get(audio_path))
                     else:
-                        display_audio_player(audio_path)
+                        display_audio_player(audio_path, transcripts.get(audio_path))
                 else:
                     st.warning(f"Audio file not found: {audio_path}")
             
@@ -933,17 +3699,54 @@ def display_media(alert: Dict):
             elif os.path.exists(media_file):
                 # Try to determine file type by extension
                 if media_file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                    st.markdown("**📷 Photo Evidence:**")
-                    try:
-                        image = Image.open(media_file)
-                        st.image(image, caption="Incident Photo", use_column_width=True)
-                    except Exception as e:
-                        st.error(f"Error loading image: {e}")
+                    display_image(media_file, f"{alert['id']}_{media_file}")
                 elif media_file.lower().endswith(('.wav', '.mp3', '.m4a', '.ogg')):
-                    display_audio_player(media_file)
+                    display_audio_player(media_file, transcripts.get(media_file))
                 else:
                     st.warning(f"Unknown file type: {media_file}")
 
+def render_live_audio_capture():
+    """Stream the microphone to the server over WebRTC instead of posting a finished blob"""
+    try:
+        from streamlit_webrtc import WebRtcMode, webrtc_streamer
+    except ImportError:
+        st.info("Live streaming needs the streamlit-webrtc package")
+        return
+    
+    if 'live_recorder' not in st.session_state:
+        service = get_transcription_service()
+        st.session_state.live_recorder = LiveAudioRecorder(lambda: PartialTranscriber(service))
+    recorder = st.session_state.live_recorder
+    
+    ctx = webrtc_streamer(
+        key="live_audio_capture",
+        mode=WebRtcMode.SENDRECV,
+        media_stream_constraints={"audio": True, "video": False},
+        audio_frame_callback=recorder.add_frame,
+        on_audio_ended=recorder.finish,
+        sendback_audio=False
+    )
+    
+    if recorder.transcriber is not None:
+        st.session_state.partial_transcriber = recorder.transcriber
+    if ctx.state.playing:
+        st.caption(f"🔴 Streaming to server: {recorder.seconds:.0f}s captured")
+        if recorder.limit_reached:
+            st.warning(f"Recording limit of {MEDIA_LIMITS['audio']['max_seconds'] / 60:g} minutes reached; press Stop")
+        return
+    
+    try:
+        media_path = recorder.take_recording()
+    except Exception as e:
+        st.error(f"Error saving live recording: {e}")
+        logger.error(f"Live recording error: {e}")
+        return
+    if recorder.error:
+        st.warning(f"Part of the recording may be missing: {recorder.error}")
+    if media_path:
+        st.session_state.recorded_audio_path = media_path
+        st.success("Audio recording saved successfully!")
+
 # HTML for audio recording
 def audio_recorder_html():
     return """
@@ -1043,8 +3846,13 @@ def main():
         initial_sidebar_state="collapsed"
     )
     
+    track_render_stats()
     inject_custom_css()
     init_db()
+    collect_unreferenced_media_at_startup()
+    get_job_workers()
+    get_media_server()
+    get_transcription_service()
     
     if 'authenticated' not in st.session_state:
         st.session_state.authenticated = False
@@ -1062,13 +3870,16 @@ def main():
     # Handle audio recording messages from JavaScript
     if st.session_state.get('audio_recorded') and st.session_state.get('audio_data'):
         try:
-            audio_data = st.session_state.audio_data
-            # Convert base64 to bytes and save immediately
-            audio_bytes = base64.b64decode(audio_data.split(',')[1])
-            media_path = save_audio_file(audio_bytes)
+            media_path = save_recorded_audio(st.session_state.audio_data)
             st.session_state.recorded_audio_path = media_path
+            start_partial_transcript(media_path)
             st.session_state.audio_recorded = False
+            st.session_state.audio_data = None
             st.rerun()
+        except MediaLimitError as e:
+            st.session_state.audio_recorded = False
+            st.session_state.audio_data = None
+            st.error(str(e))
         except Exception as e:
             st.error(f"Error processing audio recording: {e}")
             logger.error(f"Audio processing error: {e}")
@@ -1156,6 +3967,17 @@ def render_main_application():
         st.markdown('</div>', unsafe_allow_html=True)
         
         st.markdown("---")
+        if user_info['role'] == 'admin':
+            cache_stats = alert_cache_stats()
+            st.caption(
+                f"Alert cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries"
+            )
+            last_render = (st.session_state.get('render_stats') or {}).get('last')
+            if last_render:
+                st.caption(
+                    f"Last rerun: {last_render['deltas']} deltas, {last_render['bytes'] / 1024:.1f} KB"
+                )
         if st.button("🚪 Sign Out", use_container_width=True):
             st.session_state.authenticated = False
             st.session_state.user_info = None
@@ -1168,12 +3990,239 @@ def render_main_application():
     elif st.session_state.current_page == 'view_alerts':
         render_view_alerts()
 
+# Paginated alert lists: session state keeps only how many pages are loaded,
+# and the keyset walk is redone each rerun so inserts and resolves never skip rows
+def render_page_size_control(list_key: str) -> int:
+    def reset_pages():
+        st.session_state[f"{list_key}_pages"] = 1
+    
+    return st.selectbox(
+        "Incidents per page",
+        PAGE_SIZE_OPTIONS,
+        index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE),
+        key=f"{list_key}_page_size",
+        on_change=reset_pages
+    )
+
+def load_alert_pages(list_key: str, fetch_page, cursor_of, page_size: int) -> Tuple[List[Dict], bool]:
+    """Fetch the pages loaded so far; returns the alerts and whether more exist"""
+    pages_loaded = st.session_state.get(f"{list_key}_pages", 1)
+    alerts = []
+    cursor = None
+    has_more = False
+    
+    for _ in range(pages_loaded):
+        # One extra row tells us whether a next page exists
+        page = fetch_page(page_size + 1, cursor)
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        alerts.extend(page)
+        if not has_more:
+            break
+        cursor = cursor_of(page[-1])
+    
+    return alerts, has_more
+
+def render_load_more(list_key: str, has_more: bool, shown: int):
+    if has_more:
+        st.caption(f"Showing the first {shown} incidents")
+        def load_more():
+            st.session_state[f"{list_key}_pages"] = st.session_state.get(f"{list_key}_pages", 1) + 1
+        
+        st.button("⬇️ Load more", key=f"{list_key}_load_more", use_container_width=True, on_click=load_more)
+    elif shown:
+        st.caption(f"Showing all {shown} incidents")
+
+ALERT_LIST_TEMPLATE = """
+<style>
+    body { margin: 0; font-family: "Source Sans Pro", sans-serif; color: #ffffff; background: transparent; }
+    #viewport { overflow-y: auto; position: relative; }
+    #rows { position: relative; }
+    .row {
+        position: absolute; left: 0; right: 6px; box-sizing: border-box;
+        background: #1a1d24; border-radius: 10px; border-left: 4px solid;
+        padding: 0.6rem 0.9rem; overflow: hidden;
+    }
+    .high { border-left-color: #dc2626; }
+    .medium { border-left-color: #f59e0b; }
+    .low { border-left-color: #10b981; }
+    .title { font-weight: 600; font-size: 1.02rem; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
+    .number { color: #9ca3af; margin-right: 0.4rem; }
+    .meta, .foot { color: #cbd5e1; font-size: 0.82rem; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
+    .description {
+        font-size: 0.9rem; margin: 0.2rem 0; display: -webkit-box;
+        -webkit-line-clamp: 2; -webkit-box-orient: vertical; overflow: hidden;
+    }
+</style>
+<div id="viewport"><div id="rows"></div></div>
+<script>
+const alerts = __ALERTS__;
+const rowHeight = __ROW_HEIGHT__, overscan = __OVERSCAN__, gap = 8;
+const labels = {high: "🔴 Critical", medium: "🟡 Urgent", low: "🟢 Routine"};
+const viewport = document.getElementById("viewport");
+const rows = document.getElementById("rows");
+viewport.style.height = __HEIGHT__ + "px";
+rows.style.height = alerts.length * rowHeight + "px";
+
+function div(className, text) {
+    const node = document.createElement("div");
+    node.className = className;
+    if (text !== undefined) node.textContent = text;
+    return node;
+}
+
+function buildRow(alert, index) {
+    const row = div("row " + alert.priority);
+    row.style.top = index * rowHeight + "px";
+    row.style.height = rowHeight - gap + "px";
+    const title = div("title");
+    const number = document.createElement("span");
+    number.className = "number";
+    number.textContent = "#" + (index + 1);
+    title.append(number, alert.title);
+    row.append(
+        title,
+        div("meta", [labels[alert.priority] || alert.priority, alert.department, alert.type].join(" • ")),
+        div("description", alert.description),
+        div("foot", alert.footer)
+    );
+    return row;
+}
+
+let shown = "";
+function render() {
+    const first = Math.max(0, Math.floor(viewport.scrollTop / rowHeight) - overscan);
+    const last = Math.min(alerts.length, Math.ceil((viewport.scrollTop + viewport.clientHeight) / rowHeight) + overscan);
+    if (shown === first + ":" + last) return;
+    shown = first + ":" + last;
+    rows.replaceChildren(...alerts.slice(first, last).map((alert, i) => buildRow(alert, first + i)));
+}
+viewport.addEventListener("scroll", () => requestAnimationFrame(render), {passive: true});
+render();
+</script>
+"""
+
+def alert_list_row(alert: Dict, enrichment: Optional[List[Dict]]) -> Dict:
+    description = alert['description'] or ""
+    if len(description) > ALERT_LIST_DESCRIPTION_CHARS:
+        description = description[:ALERT_LIST_DESCRIPTION_CHARS].rstrip() + "…"
+    footer = f"Reported by {alert['created_by']} • {alert['created_at'][:16]}"
+    if alert.get('resolved_by'):
+        footer += f" • Resolved by {alert['resolved_by']} • {(alert['resolved_at'] or '')[:16]}"
+    summary = enrichment_summary(enrichment)
+    if summary:
+        footer += f" • {summary}"
+    return {
+        'title': alert['title'],
+        'priority': alert['priority'],
+        'department': alert['department'],
+        'type': alert['alert_type'].title(),
+        'description': description,
+        'footer': footer
+    }
+
+def render_alert_list(alerts: List[Dict], enrichment: Optional[Dict[int, List[Dict]]] = None):
+    """Send a whole alert list as one component with virtualised scrolling.
+
+    Only the rows in view (plus a few either side) exist in the DOM, and the
+    list costs one delta however many alerts it holds. Alert text is set with
+    textContent, never parsed as HTML.
+    """
+    enrichment = enrichment or {}
+    rows = [alert_list_row(alert, enrichment.get(alert['id'])) for alert in alerts]
+    height = min(ALERT_LIST_MAX_HEIGHT, len(rows) * ALERT_LIST_ROW_HEIGHT)
+    st.components.v1.html(
+        ALERT_LIST_TEMPLATE
+        .replace("__ALERTS__", script_json(rows))
+        .replace("__ROW_HEIGHT__", str(ALERT_LIST_ROW_HEIGHT))
+        .replace("__OVERSCAN__", str(ALERT_LIST_OVERSCAN_ROWS))
+        .replace("__HEIGHT__", str(height)),
+        height=height
+    )
+
+@st.fragment
+def render_alert_detail(list_key: str, alerts: List[Dict], enrichment: Dict[int, List[Dict]],
+                        can_resolve: bool = False, show_debug: bool = False):
+    """Full card, evidence and actions for the incident picked from the list.
+
+    A fragment of its own, so opening an incident, ticking debug info or
+    resolving reruns just this card. Resolved ids are kept in the list's
+    session state and dropped from the card's choices straight away; the list
+    itself picks the change up the next time it is rendered. Until then the
+    choices keep the list's numbering, so #3 here is still #3 there.
+    """
+    resolved_ids = st.session_state.setdefault(f"{list_key}_resolved_ids", set())
+    # Once the list no longer holds an alert its id need not be remembered
+    resolved_ids.intersection_update(alert['id'] for alert in alerts)
+    if st.session_state.get(f"{list_key}_resolved_message"):
+        st.success(st.session_state.pop(f"{list_key}_resolved_message"))
+    
+    numbers = {alert['id']: index + 1 for index, alert in enumerate(alerts)}
+    alerts = [alert for alert in alerts if alert['id'] not in resolved_ids]
+    if not alerts:
+        return
+    by_id = {alert['id']: alert for alert in alerts}
+    alert_id = st.selectbox(
+        "Open incident",
+        list(by_id),
+        format_func=lambda i: f"#{numbers[i]} {by_id[i]['title']}",
+        key=f"{list_key}_selected"
+    )
+    if alert_id is None:
+        return
+    alert = by_id[alert_id]
+    user_info = st.session_state.user_info
+    priority_labels = {'high': '🔴 Critical', 'medium': '🟡 Urgent', 'low': '🟢 Routine'}
+    
+    col1, col2 = st.columns([4, 1])
+    
+    with col1:
+        resolved = ""
+        if alert['status'] == 'resolved':
+            resolved = (f"<p><strong>Resolved by {html.escape(alert['resolved_by'] or 'Unknown')} • "
+                        f"{(alert['resolved_at'] or 'Unknown')[:16]}</strong></p>")
+        st.markdown(f"""
+            <div class="alert-card card-{alert['priority']}">
+                <h4>{html.escape(alert['title'])}</h4>
+                <p><strong>{priority_labels.get(alert['priority'], alert['priority'])}</strong> •
+                   <strong>Department:</strong> {html.escape(alert['department'])} •
+                   <strong>Evidence Type:</strong> {html.escape(alert['alert_type'].title())}</p>
+                <p><strong>Description:</strong> {html.escape(alert['description'] or '')}</p>
+                <p><em>Reported by {html.escape(alert['created_by'])} • {alert['created_at'][:16]}</em></p>
+                {resolved}
+            </div>
+        """, unsafe_allow_html=True)
+        render_enrichment_status(enrichment.get(alert['id']))
+        
+        with st.expander("View Evidence Details"):
+            # Temporary debug info (can be removed in production)
+            if show_debug and st.checkbox("Show debug info", key=f"debug_{alert['id']}"):
+                st.write(f"Media path: {alert.get('media_path')}")
+                st.write(f"Media files: {alert.get('media_path', '').split(',') if alert.get('media_path') else []}")
+            
+            display_media(alert)
+    
+    with col2:
+        if alert['status'] == 'resolved':
+            st.success("Resolved")
+        elif user_info['role'] in ['department_head', 'admin'] and can_resolve:
+            def resolve():
+                if resolve_alert(alert['id'], user_info['username']):
+                    resolved_ids.add(alert['id'])
+                    st.session_state[f"{list_key}_resolved_message"] = f"Incident resolved: {alert['title']}"
+            
+            # Runs before the fragment re-executes, which then renders without this alert
+            st.button("✅ Resolve Incident", key=f"resolve_{alert['id']}", use_container_width=True, on_click=resolve)
+        else:
+            st.info("⏳ Pending Resolution")
+            st.caption("Department Head Action Required")
+
 def render_dashboard():
     st.markdown('<div class="main-header">Incident Dashboard</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Real-time emergency monitoring and management</div>', unsafe_allow_html=True)
     
     user_info = st.session_state.user_info
-    alerts = get_alerts(user_info['department'], user_info['role'])
+    counts = get_alert_counts(user_info['department'], user_info['role'])
     
     # Role-specific welcome message
     if user_info['role'] == 'employee':
@@ -1196,68 +4245,95 @@ def render_dashboard():
     with col1:
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
         st.markdown('<div class="metric-label">Total Active</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="metric-value">{len(alerts)}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-value">{counts["total"]}</div>', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
-        high_priority = len([a for a in alerts if a['priority'] == 'high'])
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
         st.markdown('<div class="metric-label">Critical</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="metric-value">{high_priority}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-value">{counts["high"]}</div>', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col3:
-        medium_priority = len([a for a in alerts if a['priority'] == 'medium'])
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
         st.markdown('<div class="metric-label">Urgent</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="metric-value">{medium_priority}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-value">{counts["medium"]}</div>', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col4:
-        low_priority = len([a for a in alerts if a['priority'] == 'low'])
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
         st.markdown('<div class="metric-label">Routine</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="metric-value">{low_priority}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-value">{counts["low"]}</div>', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     st.markdown("---")
     
+    render_live_feed(user_info)
+    
     # Active Alerts Section
     st.markdown("### Active Incidents")
     
-    if not alerts:
+    if not counts['total']:
         st.info("No active incidents reported.")
         return
     
-    for alert in alerts:
-        priority_class = f"card-{alert['priority']}"
-        priority_icons = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}
-        
-        st.markdown(f'<div class="alert-card {priority_class}">', unsafe_allow_html=True)
-        
-        col1, col2 = st.columns([4, 1])
-        
-        with col1:
-            st.markdown(f"#### {priority_icons[alert['priority']]} {alert['title']}")
-            st.markdown(f"**Description:** {alert['description']}")
-            st.markdown(f"**Department:** {alert['department']} • **Type:** {alert['alert_type'].title()}")
-            st.markdown(f"*Reported by {alert['created_by']} at {alert['created_at'][:16]}*")
-            
-            # Add expandable evidence section in dashboard too
-            with st.expander("View Evidence"):
-                display_media(alert)
-        
-        with col2:
-            # Only show resolve button for department heads and admin
-            if user_info['role'] in ['department_head', 'admin']:
-                if st.button("✅ Resolve", key=f"resolve_{alert['id']}", use_container_width=True):
-                    if resolve_alert(alert['id'], user_info['username']):
-                        st.success("Incident resolved")
-                        st.rerun()
-            else:
-                st.info("🔒 Department Head Only")
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+    render_dashboard_alerts(user_info)
+
+@st.fragment
+def render_dashboard_alerts(user_info: Dict):
+    """The dashboard's incident list; paging and opening incidents rerun only this part"""
+    page_size = render_page_size_control("dashboard_active")
+    alerts, has_more = load_alert_pages(
+        "dashboard_active",
+        lambda limit, after: get_alerts(user_info['department'], user_info['role'], limit, after),
+        active_alert_cursor,
+        page_size
+    )
+    
+    enrichment = get_enrichment_status([alert['id'] for alert in alerts])
+    render_alert_list(alerts, enrichment)
+    render_load_more("dashboard_active", has_more, len(alerts))
+    render_alert_detail("dashboard_active", alerts, enrichment, can_resolve=True)
+
+@st.fragment(run_every=ALERT_FEED_INTERVAL_SECONDS)
+def render_live_feed(user_info: Dict):
+    """Incidents created or resolved since this session last looked, polled on a timer"""
+    if 'feed_seq' not in st.session_state:
+        st.session_state.feed_seq = latest_alert_event_seq()
+        st.session_state.feed_items = []
+    
+    events = get_alert_events(user_info['department'], user_info['role'], st.session_state.feed_seq)
+    if events:
+        st.session_state.feed_seq = events[-1]['seq']
+        for event in events:
+            alert = event['alert']
+            if event['event'] == 'created' and alert['priority'] == 'high':
+                st.toast(f"New critical incident: {alert['title']}", icon="🚨")
+        st.session_state.feed_items = (events[::-1] + st.session_state.feed_items)[:ALERT_FEED_SHOWN]
+        if len(events) == ALERT_FEED_MAX_EVENTS:
+            # A backlog this long comes from a bulk import; skip it rather than replay it
+            st.session_state.feed_seq = latest_alert_event_seq()
+    
+    if not st.session_state.feed_items:
+        return
+    
+    priority_labels = {'high': '🔴 Critical', 'medium': '🟡 Urgent', 'low': '🟢 Routine'}
+    lines = []
+    for event in st.session_state.feed_items:
+        alert = event['alert']
+        if event['event'] == 'created':
+            what = f"{priority_labels.get(alert['priority'], alert['priority'])} reported"
+        else:
+            what = f"✅ Resolved by {html.escape(alert['resolved_by'] or 'Unknown')}"
+        lines.append(f"<li>{what}: <strong>{html.escape(alert['title'])}</strong> "
+                     f"({html.escape(alert['department'])})</li>")
+    st.markdown("### Live Updates")
+    st.markdown(f"<ul>{''.join(lines)}</ul>", unsafe_allow_html=True)
+    
+    # The incident list and counts below only change on a full rerun
+    if st.button("🔄 Refresh incident list", key="feed_refresh"):
+        st.session_state.feed_items = []
+        st.rerun()
 
 def render_report_emergency():
     st.markdown('<div class="main-header">Report Emergency</div>', unsafe_allow_html=True)
@@ -1291,30 +4367,41 @@ def render_report_emergency():
         uploaded_image = st.file_uploader("Upload incident photo", 
                                         type=['jpg', 'jpeg', 'png'],
                                         help="Upload clear photos of the incident scene")
+        uploaded_image = check_upload(uploaded_image, "image")
     
     with col2:
         st.markdown("### Audio Evidence")
         
         # Audio recording section
         st.markdown("#### Record Live Audio")
-        st.components.v1.html(audio_recorder_html(), height=300)
+        capture_mode = st.radio(
+            "Recording method",
+            ["Browser recorder", "Live stream (WebRTC)"],
+            horizontal=True,
+            help="Live streaming saves the audio on the server as you speak"
+        )
+        if capture_mode == "Live stream (WebRTC)":
+            render_live_audio_capture()
+        else:
+            st.components.v1.html(audio_recorder_html(), height=300)
         
         # Handle recorded audio from JavaScript
         if st.session_state.get('audio_recorded'):
-            audio_data = st.session_state.audio_data
-            # Convert base64 to bytes and save immediately
-            audio_bytes = base64.b64decode(audio_data.split(',')[1])
-            media_path = save_audio_file(audio_bytes)
-            st.session_state.recorded_audio_path = media_path
+            try:
+                media_path = save_recorded_audio(st.session_state.audio_data)
+                st.session_state.recorded_audio_path = media_path
+                start_partial_transcript(media_path)
+                st.success("Audio recording saved successfully!")
+            except MediaLimitError as e:
+                st.error(str(e))
             st.session_state.audio_recorded = False
-            st.success("Audio recording saved successfully!")
+            st.session_state.audio_data = None
         
         # Display and manage recorded audio
         if st.session_state.get('recorded_audio_path'):
             st.markdown("#### Current Recording")
-            with open(st.session_state.recorded_audio_path, 'rb') as audio_file:
-                audio_bytes = audio_file.read()
-            st.audio(audio_bytes, format="audio/wav")
+            st.audio(media_url(st.session_state.recorded_audio_path),
+                     format=audio_mime_type(st.session_state.recorded_audio_path))
             
             col_a, col_b = st.columns(2)
             with col_a:
@@ -1323,7 +4410,8 @@ def render_report_emergency():
             with col_b:
                 if st.button("🗑️ Delete Recording", key="delete_recording"):
                     try:
-                        os.remove(st.session_state.recorded_audio_path)
+                        # The blob may be shared with another report; unreferenced
+                        # blobs are cleaned up by collect_unreferenced_media
                         del st.session_state.recorded_audio_path
                         st.rerun()
                     except:
@@ -1333,6 +4421,7 @@ def render_report_emergency():
         uploaded_audio = st.file_uploader("Upload audio file", 
                                         type=['wav', 'mp3', 'm4a'],
                                         help="Upload pre-recorded audio file")
+        uploaded_audio = check_upload(uploaded_audio, "audio")
     
     # Preview section
     if uploaded_image or st.session_state.get('recorded_audio_path') or uploaded_audio:
@@ -1341,19 +4430,22 @@ def render_report_emergency():
         
         with preview_col1:
             if uploaded_image:
-                image = Image.open(uploaded_image)
-                st.image(image, caption="Incident Photo", use_column_width=True)
+                # Not stored until submission, so sent inline; skip the PIL decode/re-encode
+                st.image(uploaded_image, caption="Incident Photo", use_column_width=True)
         
         with preview_col2:
             if st.session_state.get('recorded_audio_path'):
-                with open(st.session_state.recorded_audio_path, 'rb') as audio_file:
-                    audio_bytes = audio_file.read()
-                st.audio(audio_bytes, format="audio/wav")
+                st.audio(media_url(st.session_state.recorded_audio_path),
+                         format=audio_mime_type(st.session_state.recorded_audio_path))
                 st.markdown("*Live Recording Preview*")
             elif uploaded_audio:
                 st.audio(uploaded_audio, format="audio/wav")
                 st.markdown("*Uploaded Audio Preview*")
     
+    # Apply first: the fragment asks for a rerun while a draft is still pending
+    apply_transcript_draft()
+    render_partial_transcript()
+    
     # Incident Report Form
     st.markdown("### Incident Details")
     
@@ -1367,22 +4459,21 @@ def render_report_emergency():
         
         with col2:
             # ALL users (employees and department heads) can select any department
-            departments = ["Fire", "Health Care", "Equipment Damage", "Missing Items", "General"]
-            
             # Show user's department as default but allow selection of any department
             user_department = user_info['department']
-            default_index = departments.index(user_department) if user_department in departments else 0
+            default_index = DEPARTMENTS.index(user_department) if user_department in DEPARTMENTS else 0
             
             department = st.selectbox(
                 "Responsible Department*",
-                departments,
+                DEPARTMENTS,
                 index=default_index,
                 help="Select the department responsible for handling this incident"
             )
         
         description = st.text_area("Incident Description*",
                                  placeholder="Provide detailed description of the incident including what happened, people involved, and immediate risks",
-                                 height=100)
+                                 height=100,
+                                 key="incident_description")
         
         submitted = st.form_submit_button("🚨 Submit Incident Report", use_container_width=True)
         
@@ -1404,44 +4495,186 @@ def render_report_emergency():
                         
                         # Save media files
                         media_paths = []
+                        try:
+                            if uploaded_image:
+                                image_path = save_uploaded_file(uploaded_image, "image")
+                                media_paths.append(f"image:{image_path}")
+                            
+                            # Priority: Use recorded audio first, then uploaded audio
+                            if st.session_state.get('recorded_audio_path'):
+                                media_paths.append(f"audio:{st.session_state.recorded_audio_path}")
+                            elif uploaded_audio:
+                                audio_path = save_uploaded_file(uploaded_audio, "audio")
+                                media_paths.append(f"audio:{audio_path}")
+                        except MediaLimitError as e:
+                            st.error(str(e))
+                            media_paths = None
                         
-                        if uploaded_image:
-                            image_path = save_uploaded_file(uploaded_image, "image")
-                            media_paths.append(f"image:{image_path}")
-                        
-                        # Priority: Use recorded audio first, then uploaded audio
-                        if st.session_state.get('recorded_audio_path'):
-                            media_paths.append(f"audio:{st.session_state.recorded_audio_path}")
-                        elif uploaded_audio:
-                            audio_path = save_uploaded_file(uploaded_audio, "audio")
-                            media_paths.append(f"audio:{audio_path}")
-                        
-                        media_path = ",".join(media_paths) if media_paths else None
-                        
-                        alert_data = {
-                            'title': f"Incident at {location}",  # Use location as title
-                            'description': description,
-                            'department': department,
-                            'priority': "high",
-                            'alert_type': alert_type,
-                            'media_path': media_path,
-                            'created_by': user_info['username']
-                        }
-                        
-                        if create_alert(alert_data):
-                            st.success("Incident report submitted successfully")
-                            st.balloons()
-                            # Clear recorded audio after successful submission
-                            if 'recorded_audio_path' in st.session_state:
-                                del st.session_state.recorded_audio_path
-                            if 'audio_recorded' in st.session_state:
-                                del st.session_state.audio_recorded
-                            if 'audio_data' in st.session_state:
-                                del st.session_state.audio_data
-                        else:
-                            st.error("Error submitting incident report")
+                        if media_paths is not None:
+                            media_path = ",".join(media_paths) if media_paths else None
+                            
+                            similar = find_similar_alerts(location, description)
+                            # Bounded wait: falls back to similar alerts or keyword rules if the LLM is slow
+                            priority = classify_priority(location, description, similar=similar)
+                            
+                            alert_data = {
+                                'title': incident_title(location),
+                                'description': description,
+                                'department': department,
+                                'priority': priority['priority'],
+                                'priority_source': priority['source'],
+                                'alert_type': alert_type,
+                                'media_path': media_path,
+                                'created_by': user_info['username']
+                            }
+                            
+                            duplicates = find_duplicate_alerts(alert_data)
+                            if duplicates:
+                                # Let the reporter decide below, outside the form
+                                st.session_state.pending_report = {
+                                    'alert_data': alert_data,
+                                    'duplicates': duplicates,
+                                    'similar': similar
+                                }
+                            else:
+                                submit_new_report(alert_data, similar)
             else:
                 st.error("Please complete all required fields")
+    
+    if st.session_state.get('pending_report'):
+        render_duplicate_review()
+
+def start_partial_transcript(media_path: str):
+    """Transcribe a just-saved recording in the background for the description draft"""
+    pcm_path = pcm_audio_path(media_path)
+    if not os.path.exists(pcm_path):
+        return
+    transcriber = PartialTranscriber(get_transcription_service())
+    transcriber.feed_file(pcm_path)
+    st.session_state.partial_transcriber = transcriber
+
+@st.fragment(run_every=PARTIAL_REFRESH_SECONDS)
+def render_partial_transcript():
+    """Live transcript of the current recording; refreshes on its own while recording"""
+    transcriber = st.session_state.get('partial_transcriber')
+    if transcriber is None:
+        return
+    
+    st.markdown("#### Live Transcript")
+    st.markdown(transcriber.text or "_Listening..._")
+    stats = transcriber.latency_stats()
+    if stats['segments']:
+        st.caption(
+            f"{stats['segments']} segments, speech-to-text latency "
+            f"p50 {stats['p50_seconds']:.1f}s, max {stats['max_seconds']:.1f}s"
+        )
+    if transcriber.error:
+        st.caption(f"Live transcript unavailable: {transcriber.error}")
+    
+    # Widgets outside this fragment only change on a full rerun, so ask for one
+    # only when it would actually change the description
+    if transcriber.finished and pending_transcript_draft() is not None:
+        st.rerun()
+
+def pending_transcript_draft() -> Optional[str]:
+    """The transcript to put in the description, or None if it would change nothing"""
+    transcriber = st.session_state.get('partial_transcriber')
+    draft = transcriber.text if transcriber else ""
+    applied = st.session_state.get('applied_transcript', "")
+    if not draft or draft == applied:
+        return None
+    if st.session_state.get('incident_description', "") not in ("", applied):
+        return None  # the reporter has written their own
+    return draft
+
+def apply_transcript_draft():
+    """Pre-fill the description with the transcript unless the reporter has edited it"""
+    draft = pending_transcript_draft()
+    if draft is not None:
+        st.session_state.incident_description = draft
+        st.session_state.applied_transcript = draft
+
+def check_upload(uploaded_file, file_type: str):
+    """Reject an upload over the size limit as soon as it arrives"""
+    if uploaded_file is None:
+        return None
+    try:
+        check_media_size(uploaded_file.size, file_type)
+    except MediaLimitError as e:
+        st.error(str(e))
+        return None
+    return uploaded_file
+
+def clear_recorded_audio():
+    """Forget the recorded audio once it belongs to a submitted report"""
+    if 'recorded_audio_path' in st.session_state:
+        del st.session_state.recorded_audio_path
+    if 'audio_recorded' in st.session_state:
+        del st.session_state.audio_recorded
+    if 'audio_data' in st.session_state:
+        del st.session_state.audio_data
+    if 'partial_transcriber' in st.session_state:
+        del st.session_state.partial_transcriber
+    if 'applied_transcript' in st.session_state:
+        del st.session_state.applied_transcript
+
+def submit_new_report(alert_data: Dict, similar: List[Dict]):
+    if create_alert(alert_data):
+        st.success(f"Incident report submitted successfully ({alert_data['priority']} priority)")
+        st.balloons()
+        
+        if similar:
+            suggested_department = suggest_from_similar(similar)['department']
+            if suggested_department and suggested_department != alert_data['department']:
+                st.info(f"Similar past incidents were mostly handled by **{suggested_department}**")
+            st.markdown("**Similar recent incidents**")
+            for match in similar:
+                st.caption(
+                    f"#{match['id']} {match['title']} • {match['department']} • "
+                    f"{match['priority']} • similarity {match['score']:.2f}"
+                )
+        
+        # Clear recorded audio after successful submission
+        clear_recorded_audio()
+    else:
+        st.error("Error submitting incident report")
+
+def render_duplicate_review():
+    """Offer to merge a report into an active alert that looks like the same incident"""
+    pending = st.session_state.pending_report
+    alert_data = pending['alert_data']
+    
+    st.markdown("### Possible Duplicate")
+    st.warning("This report looks like an incident that is already active. "
+               "Merging adds your description and evidence to the existing incident.")
+    
+    for duplicate in pending['duplicates']:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(f"**#{duplicate['id']} {duplicate['title']}** • {duplicate['department']} • {duplicate['priority']}")
+            st.caption(
+                f"Reported by {duplicate['created_by']} at {duplicate['created_at'][:16]} • "
+                f"{duplicate['similarity']:.0%} similar"
+            )
+        with col2:
+            if st.button("🔗 Merge", key=f"merge_into_{duplicate['id']}", use_container_width=True):
+                del st.session_state.pending_report
+                if merge_report_into_alert(duplicate['id'], alert_data):
+                    st.success(f"Report merged into incident #{duplicate['id']}")
+                    clear_recorded_audio()
+                else:
+                    st.error("Error merging incident report")
+                return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("➕ Submit as New Incident", key="submit_despite_duplicates", use_container_width=True):
+            del st.session_state.pending_report
+            submit_new_report(alert_data, pending['similar'])
+    with col2:
+        if st.button("✖️ Cancel", key="cancel_pending_report", use_container_width=True):
+            del st.session_state.pending_report
+            st.rerun()
 
 def render_view_alerts():
     st.markdown('<div class="main-header">Incident Management</div>', unsafe_allow_html=True)
@@ -1465,109 +4698,86 @@ def render_view_alerts():
     tab1, tab2 = st.tabs(["🚨 Active Incidents", "📋 Resolved Cases"])
     
     with tab1:
-        st.markdown("### Active Incidents")
-        active_alerts = get_alerts(user_info['department'], user_info['role'])
-        
-        if not active_alerts:
-            st.info("No active incidents in your department.")
-        else:
-            for alert in active_alerts:
-                priority_class = f"card-{alert['priority']}"
-                priority_icons = {'high': '🔴 Critical', 'medium': '🟡 Urgent', 'low': '🟢 Routine'}
-                
-                st.markdown(f'<div class="alert-card {priority_class}">', unsafe_allow_html=True)
-                
-                col1, col2 = st.columns([4, 1])
-                
-                with col1:
-                    st.markdown(f"#### {alert['title']}")
-                    st.markdown(f"**{priority_icons[alert['priority']]}** • **Department:** {alert['department']}")
-                    st.markdown(f"**Description:** {alert['description']}")
-                    st.markdown(f"**Evidence Type:** {alert['alert_type'].title()}")
-                    st.markdown(f"*Reported by {alert['created_by']} • {alert['created_at'][:16]}*")
-                    
-                    # Expandable media section
-                    with st.expander("View Evidence Details"):
-                        # Temporary debug info (can be removed in production)
-                        if st.checkbox("Show debug info", key=f"debug_{alert['id']}"):
-                            st.write(f"Media path: {alert.get('media_path')}")
-                            st.write(f"Media files: {alert.get('media_path', '').split(',') if alert.get('media_path') else []}")
-                        
-                        display_media(alert)
-                
-                with col2:
-                    # Only show resolve button for department heads and admin
-                    if user_info['role'] in ['department_head', 'admin']:
-                        if st.button("✅ Resolve Incident", key=f"resolve_{alert['id']}", use_container_width=True):
-                            if resolve_alert(alert['id'], user_info['username']):
-                                st.success("Incident resolved")
-                                st.rerun()
-                    else:
-                        st.info("⏳ Pending Resolution")
-                        st.caption("Department Head Action Required")
-                
-                st.markdown('</div>', unsafe_allow_html=True)
+        render_active_tab(user_info)
     
     with tab2:
-        st.markdown("### Previously Resolved Cases")
-        resolved_alerts = get_resolved_alerts(user_info['department'], user_info['role'])
-        
-        if not resolved_alerts:
-            st.info("No resolved incidents found.")
+        render_resolved_tab(user_info)
+
+# Each tab is a fragment: paging, filtering and opening incidents rerun only that tab
+@st.fragment
+def render_active_tab(user_info: Dict):
+    st.markdown("### Active Incidents")
+    page_size = render_page_size_control("view_active")
+    active_alerts, has_more = load_alert_pages(
+        "view_active",
+        lambda limit, after: get_alerts(user_info['department'], user_info['role'], limit, after),
+        active_alert_cursor,
+        page_size
+    )
+    
+    if not active_alerts:
+        st.info("No active incidents in your department.")
+    else:
+        enrichment = get_enrichment_status([alert['id'] for alert in active_alerts])
+        render_alert_list(active_alerts, enrichment)
+        render_load_more("view_active", has_more, len(active_alerts))
+        render_alert_detail("view_active", active_alerts, enrichment, can_resolve=True, show_debug=True)
+
+@st.fragment
+def render_resolved_tab(user_info: Dict):
+    st.markdown("### Previously Resolved Cases")
+    page_size = render_page_size_control("view_resolved")
+    
+    # Filters and sort are part of the query, so they cover every resolved
+    # case rather than just the pages loaded; changing one starts from page 1
+    def reset_pages():
+        st.session_state["view_resolved_pages"] = 1
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        departments = DEPARTMENTS if user_info['role'] == 'admin' else [user_info['department']]
+        department_filter = st.selectbox(
+            "Filter by Department",
+            ["All"] + departments,
+            key="resolved_dept_filter",
+            on_change=reset_pages
+        )
+    with col2:
+        priority_filter = st.selectbox(
+            "Filter by Priority",
+            ["All", "high", "medium", "low"],
+            key="resolved_priority_filter",
+            on_change=reset_pages
+        )
+    with col3:
+        date_sort = st.selectbox(
+            "Sort by Date",
+            ["Newest First", "Oldest First"],
+            key="resolved_date_sort",
+            on_change=reset_pages
+        )
+    
+    filter_department = None if department_filter == "All" else department_filter
+    priority = None if priority_filter == "All" else priority_filter
+    resolved_alerts, has_more = load_alert_pages(
+        "view_resolved",
+        lambda limit, after: get_resolved_alerts(
+            user_info['department'], user_info['role'], limit, after,
+            filter_department, priority, date_sort == "Oldest First"
+        ),
+        resolved_alert_cursor,
+        page_size
+    )
+    
+    if not resolved_alerts:
+        if filter_department or priority:
+            st.info("No resolved incidents match the filters.")
         else:
-            # Add filter options for resolved cases
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                department_filter = st.selectbox(
-                    "Filter by Department",
-                    ["All"] + list(set([alert['department'] for alert in resolved_alerts])),
-                    key="resolved_dept_filter"
-                )
-            with col2:
-                priority_filter = st.selectbox(
-                    "Filter by Priority",
-                    ["All", "high", "medium", "low"],
-                    key="resolved_priority_filter"
-                )
-            with col3:
-                date_sort = st.selectbox(
-                    "Sort by Date",
-                    ["Newest First", "Oldest First"],
-                    key="resolved_date_sort"
-                )
-            
-            # Apply filters
-            filtered_alerts = resolved_alerts
-            
-            if department_filter != "All":
-                filtered_alerts = [alert for alert in filtered_alerts if alert['department'] == department_filter]
-            
-            if priority_filter != "All":
-                filtered_alerts = [alert for alert in filtered_alerts if alert['priority'] == priority_filter]
-            
-            if date_sort == "Oldest First":
-                filtered_alerts = sorted(filtered_alerts, key=lambda x: x['resolved_at'] or x['created_at'])
-            else:
-                filtered_alerts = sorted(filtered_alerts, key=lambda x: x['resolved_at'] or x['created_at'], reverse=True)
-            
-            for alert in filtered_alerts:
-                priority_class = f"card-{alert['priority']}"
-                priority_icons = {'high': '🔴 Critical', 'medium': '🟡 Urgent', 'low': '🟢 Routine'}
-                
-                st.markdown(f'<div class="alert-card {priority_class}">', unsafe_allow_html=True)
-                
-                st.markdown(f"#### {alert['title']}")
-                st.markdown(f"**{priority_icons[alert['priority']]}** • **Department:** {alert['department']}")
-                st.markdown(f"**Description:** {alert['description']}")
-                st.markdown(f"**Evidence Type:** {alert['alert_type'].title()}")
-                st.markdown(f"*Reported by {alert['created_by']} • {alert['created_at'][:16]}*")
-                st.markdown(f"**Resolved by {alert['resolved_by']} • {alert['resolved_at'][:16] if alert['resolved_at'] else 'Unknown'}**")
-                
-                # Expandable media section for resolved cases too
-                with st.expander("View Evidence Details"):
-                    display_media(alert)
-                
-                st.markdown('</div>', unsafe_allow_html=True)
+            st.info("No resolved incidents found.")
+    else:
+        render_alert_list(resolved_alerts)
+        render_load_more("view_resolved", has_more, len(resolved_alerts))
+        render_alert_detail("view_resolved", resolved_alerts, {})
 
 if __name__ == "__main__":
     main()